@@ -0,0 +1,91 @@
+import os, sys, random
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uasset, udecode, umeshcache, usynth
+from uasset import UAsset, UProject
+
+@pytest.fixture
+def uproject(tmp_path, monkeypatch): # Synth packages under tmp_path/Content/Synth, caches under tmp_path/Export
+    monkeypatch.setattr(uasset, 'use_asset_cache', False)
+    monkeypatch.setattr(uasset, 'use_header_cache', False)
+    monkeypatch.setattr(uasset, 'logging', False)
+    uproject = UProject.__new__(UProject)
+    uproject.dir = uproject.engine_dir = str(tmp_path)
+    uproject.registry = None
+    return uproject
+def Save(pkg:usynth.SynthPackage, uproject:UProject, name:str) -> str: return pkg.Save(os.path.join(uproject.dir, "Content", "Synth", name))
+def Open(filepath:str, uproject:UProject, lazy=False) -> UAsset:
+    asset = UAsset(filepath, uproject=uproject, lazy=lazy)
+    asset.Read(False)
+    return asset
+def AssertTreeEqual(a, b, path="data"): # umeshcache round trips tuples as lists & arrays as read only views
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray): np.testing.assert_array_equal(a, b, err_msg=path)
+    elif isinstance(a, dict):
+        assert a.keys() == b.keys(), path
+        for key in a: AssertTreeEqual(a[key], b[key], f"{path}.{key}")
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b), path
+        for i, (va, vb) in enumerate(zip(a, b)): AssertTreeEqual(va, vb, f"{path}[{i}]")
+    else: assert a == b, path
+
+def test_decode_instances(uproject, monkeypatch):
+    written = []
+    monkeypatch.setattr(usynth, 'RotatorMatrix', lambda *args, fn=usynth.RotatorMatrix: written.append(fn(*args)) or written[-1])
+    pkg = usynth.SynthMapPackage(4, foliage_instances=300)
+    asset = Open(Save(pkg, uproject, "Foliage.umap"), uproject)
+    try:
+        export = next(export for export in asset.exports if export.export_class_type == 'FoliageInstancedStaticMeshComponent')
+        instances = udecode.DecodeInstances(export)
+    finally: asset.Close()
+    assert instances.shape == (300, 4, 4)
+    np.testing.assert_array_equal(instances, np.array(written, np.float32).reshape(-1, 4, 4))
+
+@pytest.mark.parametrize("tri_counts, lod, expected", [
+    ([1000, 500, 250], 0, 0), ([1000, 500, 250], 1, 1), ([1000, 500, 250], 5, 2), ([1000, 500, 250], udecode.lod_lowest_poly, 2),
+    ([None, 500, 250], 0, 1), ([1000, None, 250], 1, 0), ([100, 500, None], udecode.lod_lowest_poly, 0), ([None, None], 0, None),
+])
+def test_select_lod(tri_counts, lod, expected): assert udecode.SelectLOD(tri_counts, lod) == expected
+
+@pytest.mark.parametrize("lod, expected", [(0, 0), (1, 1), (7, 2), (udecode.lod_lowest_poly, 2)])
+def test_static_mesh_lod(uproject, lod, expected):
+    asset = Open(Save(usynth.SynthStaticMeshPackage(1000, lod_count=3), uproject, "SM_Synth.uasset"), uproject)
+    try: mesh_data = udecode.DecodeStaticMesh(asset.exports[0], lod)
+    finally: asset.Close()
+    assert (mesh_data['lod_index'], mesh_data['lod_count']) == (expected, 3)
+    assert len(mesh_data['raw']['wedge_indices']) == 3 * (1000 >> expected)
+
+def test_header_cache(uproject, monkeypatch):
+    monkeypatch.setattr(uasset, 'use_header_cache', True)
+    filepath = Save(usynth.SynthMapPackage(20, foliage_instances=10), uproject, "Cached.umap")
+    asset = Open(filepath, uproject, lazy=True)
+    for export in asset.exports: export.ReadProperties(False)
+    asset.Close()
+    assert os.path.exists(asset.HeaderCachePath())
+
+    monkeypatch.setattr(UAsset, 'ReadHeader', lambda self: pytest.fail("header cache missed"))
+    cached = Open(filepath, uproject, lazy=True)
+    try:
+        for export in cached.exports: export.ReadProperties(False)
+        assert cached.summary.__dict__.keys() == asset.summary.__dict__.keys()
+        assert (cached.summary.custom_versions, cached.summary.version_ue4) == (asset.summary.custom_versions, asset.summary.version_ue4)
+        assert list(cached.names) == list(asset.names)
+        np.testing.assert_array_equal(cached.import_table, asset.import_table)
+        np.testing.assert_array_equal(cached.export_table, asset.export_table)
+        assert cached.tag_cache == asset.tag_cache
+        for a, b in zip(asset.exports, cached.exports): assert repr(dict(b.properties)) == repr(dict(a.properties))
+    finally: cached.Close()
+
+def test_mesh_cache(uproject):
+    filepath = Save(usynth.SynthStaticMeshPackage(2000, lod_count=2), uproject, "SM_Cached.uasset")
+    asset = Open(filepath, uproject)
+    try: mesh_data = udecode.DecodeStaticMesh(asset.exports[0], 1)
+    finally: asset.Close()
+    assert umeshcache.Load(filepath, uproject, 1) is None
+    umeshcache.Save(filepath, uproject, asset.exports[0].export_class_type, asset.exports[0].object_name, mesh_data, 1, asset.stamp)
+    assert umeshcache.IsValid(filepath, uproject, 1) and not umeshcache.IsValid(filepath, uproject, 0)
+    cached = umeshcache.Load(filepath, uproject, 1)
+    assert (cached['kind'], cached['name']) == (asset.exports[0].export_class_type, asset.exports[0].object_name)
+    AssertTreeEqual(mesh_data, cached['data'])
@@ -1,11 +1,26 @@
 from __future__ import annotations
-import io, uuid, time, os, glob, json, winreg
+import io, sys, uuid, time, os, glob, json, mmap, hashlib, threading
+from collections import OrderedDict, deque
 from struct import *
 from ctypes import *
-from mathutils import *
+try: from mathutils import *
+except ImportError: pass # Headless (uprefetch pool workers), only needed when building datablocks
+import numpy as np
+import uprofile
 
 logging = True
 try_unknown_structs = False
+use_mmap = True
+use_header_cache = True
+cache_property_tags = True
+header_cache_version = 3
+header_cache_magic = b'UHC\0'
+use_asset_cache = True
+read_ahead_threads = 4 # Readers filling packages into memory ahead of the parser (ReadAhead), 0 maps on demand
+read_ahead_max_mb = 256 # Read but not yet opened packages held at once
+read_coalesce_kb = 64 # Gap between export ranges still read as one (UAsset.PrefetchExportRanges)
+read_chunk_mb = 4
+engine_dir_env = "UE_ENGINE_DIR" # Engine dir override, where there's no launcher registry (Linux, build farms)
 
 class ByteStream:
     def __init__(self, byte_stream:io.BufferedReader): self.byte_stream = byte_stream
@@ -58,10 +73,239 @@ class ByteStream:
         length = self.ReadInt32()
         if length < 0: return self.byte_stream.read(-2*length)[:-2].decode('utf-16')
         else: return self.byte_stream.read(length)[:-1].decode('ascii')
-    def ReadFName(self, names):
-        i_name, i = unpack('ii',self.byte_stream.read(8))
-        fn = names[i_name]
-        return f"{fn}_{i - 1}" if i > 0 else fn
+    def ReadFNameIndex(self) -> tuple[int,int]: return unpack('ii',self.byte_stream.read(8))
+    def ReadFName(self, names:NameTable): return names.Get(*unpack('ii',self.byte_stream.read(8)))
+    def ReadNameTable(self, count, hashed) -> list[str]:
+        names = []
+        for i in range(count):
+            name = self.ReadFString()
+            names.append(name)
+            if hashed and name != "": self.Seek(4, io.SEEK_CUR)
+        return names
+    def ReadRecords(self, dtype:np.dtype, count) -> np.ndarray: return np.frombuffer(self.ReadBytes(dtype.itemsize * count), dtype, count)
+    def ReadView(self, dtype:np.dtype, count) -> np.ndarray: return self.ReadRecords(dtype, count)
+    def Close(self): self.byte_stream.close()
+
+s_bool, s_i8, s_i16, s_i32, s_i64 = (Struct('?'), Struct('b'), Struct('h'), Struct('i'), Struct('q'))
+s_u8, s_u16, s_u32, s_u64 = (Struct('B'), Struct('H'), Struct('I'), Struct('Q'))
+s_f32, s_f64, s_fname = (Struct('f'), Struct('d'), Struct('ii'))
+class MappedByteStream(ByteStream): # Whole package mapped, decoded in place at a cursor
+    def __init__(self, byte_stream:io.BufferedReader, buf:mmap.mmap=None): # buf already holds the package (ReadAhead)
+        self.byte_stream = byte_stream
+        self.buf = buf or mmap.mmap(byte_stream.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.resident = buf is not None
+        self.pos = 0
+    def __repr__(self) -> str: return f"\"{self.byte_stream.name}\"[{'Closed' if self.byte_stream.closed else self.pos}]"
+
+    def EnsureOpen(self):
+        if self.byte_stream.closed: self.__init__(*((read_ahead and read_ahead.Take(self.byte_stream.name)) or (open(self.byte_stream.name, 'rb'),)))
+    def ReadBytes(self, count) -> bytes:
+        p = self.pos
+        self.pos += count
+        return self.buf[p:self.pos]
+    def Seek(self, offset, mode=io.SEEK_SET):
+        if mode == io.SEEK_SET: self.pos = offset
+        elif mode == io.SEEK_CUR: self.pos += offset
+        else: self.pos = len(self.buf) + offset
+    def Position(self): return self.pos
+
+    def ReadString(self, count, stopOnNull=False): return self.ReadBytes(count).decode('utf-8',errors='ignore').rstrip('\0')
+    def ReadString16(self, count, stopOnNull=False):
+        if stopOnNull:
+            end = self.pos
+            while end < self.pos + 2*count and self.buf[end:end+2] != b'\x00\x00': end += 2
+            s = self.buf[self.pos:end].decode('utf-16',errors='ignore')
+            self.pos = min(end + 2, self.pos + 2*count)
+            return s
+        else: return self.ReadBytes(2*count).decode('utf-16',errors='ignore').rstrip('\0')
+
+    def Unpack(self, s:Struct):
+        v = s.unpack_from(self.buf, self.pos)
+        self.pos += s.size
+        return v
+    def ReadBool(self):
+        p = self.pos
+        self.pos = p + 1
+        return s_bool.unpack_from(self.buf, p)[0]
+    def ReadInt8(self) -> int:
+        p = self.pos
+        self.pos = p + 1
+        return s_i8.unpack_from(self.buf, p)[0]
+    def ReadInt16(self) -> int:
+        p = self.pos
+        self.pos = p + 2
+        return s_i16.unpack_from(self.buf, p)[0]
+    def ReadInt32(self) -> int:
+        p = self.pos
+        self.pos = p + 4
+        return s_i32.unpack_from(self.buf, p)[0]
+    def ReadInt64(self) -> int:
+        p = self.pos
+        self.pos = p + 8
+        return s_i64.unpack_from(self.buf, p)[0]
+    def ReadUInt8(self) -> int:
+        p = self.pos
+        self.pos = p + 1
+        return s_u8.unpack_from(self.buf, p)[0]
+    def ReadUInt16(self) -> int:
+        p = self.pos
+        self.pos = p + 2
+        return s_u16.unpack_from(self.buf, p)[0]
+    def ReadUInt32(self) -> int:
+        p = self.pos
+        self.pos = p + 4
+        return s_u32.unpack_from(self.buf, p)[0]
+    def ReadUInt64(self) -> int:
+        p = self.pos
+        self.pos = p + 8
+        return s_u64.unpack_from(self.buf, p)[0]
+    def ReadFloat(self) -> float:
+        p = self.pos
+        self.pos = p + 4
+        return s_f32.unpack_from(self.buf, p)[0]
+    def ReadDouble(self) -> float:
+        p = self.pos
+        self.pos = p + 8
+        return s_f64.unpack_from(self.buf, p)[0]
+    def ReadStruct(self, format:str, count):
+        v = unpack_from(format, self.buf, self.pos)
+        self.pos += count
+        return v
+
+    def ReadStructure(self, ty:Structure): # Copied out, structures live on in property values and a view would pin the mapping open
+        v = ty.from_buffer_copy(self.buf, self.pos)
+        self.pos += sizeof(ty)
+        return v
+    def ReadGuid(self): return uuid.UUID(bytes_le=self.ReadBytes(16))
+    def ReadFString(self):
+        length = self.ReadInt32()
+        if length < 0: return self.ReadBytes(-2*length)[:-2].decode('utf-16')
+        else: return self.ReadBytes(length)[:-1].decode('ascii')
+    def ReadFNameIndex(self) -> tuple[int,int]:
+        fname = s_fname.unpack_from(self.buf, self.pos)
+        self.pos += 8
+        return fname
+    def ReadFName(self, names:NameTable):
+        i_name, i = s_fname.unpack_from(self.buf, self.pos)
+        self.pos += 8
+        return names.Get(i_name, i)
+    def ReadNameTable(self, count, hashed) -> list[str]:
+        names, buf, p = ([], self.buf, self.pos)
+        for i in range(count):
+            length = s_i32.unpack_from(buf, p)[0]
+            if length < 0:
+                name = buf[p + 4:p + 2 - 2*length].decode('utf-16')
+                p += 4 - 2*length
+            else:
+                name = buf[p + 4:p + 3 + length].decode('ascii')
+                p += 4 + length
+            if hashed and name != "": p += 4
+            names.append(name)
+        self.pos = p
+        return names
+    def ReadRecords(self, dtype:np.dtype, count) -> np.ndarray: # Copied out of the mapping so the table doesn't pin it open
+        records = np.frombuffer(self.buf, dtype, count, self.pos).copy()
+        self.pos += dtype.itemsize * count
+        return records
+    def ReadView(self, dtype:np.dtype, count) -> np.ndarray: # In place over the mapping, only for arrays transformed into new ones right away
+        view = np.frombuffer(self.buf, dtype, count, self.pos)
+        self.pos += dtype.itemsize * count
+        return view
+    def Close(self):
+        try: self.buf.close()
+        except BufferError: self.buf = None # A ReadView is still alive (e.g. held by a traceback), the mapping goes with its last reference
+        self.byte_stream.close()
+class ProfiledStream: # Mixed in while uprofile is enabled, reads between seeks count as bytes read
+    def __init__(self, byte_stream:io.BufferedReader, *args):
+        super().__init__(byte_stream, *args)
+        self.span_start = 0
+    def CountSpan(self): uprofile.Count('bytes_read', max(0, self.Position() - self.span_start), self.byte_stream.name)
+    def Seek(self, offset, mode=io.SEEK_SET):
+        self.CountSpan()
+        uprofile.Count('seeks', 1, self.byte_stream.name)
+        super().Seek(offset, mode)
+        self.span_start = self.Position()
+    def Close(self):
+        try:
+            self.CountSpan()
+            self.span_start = self.Position()
+        except ValueError: pass # Already closed
+        super().Close()
+class ProfiledByteStream(ProfiledStream, ByteStream): pass
+class ProfiledMappedByteStream(ProfiledStream, MappedByteStream): pass
+def OpenByteStream(filepath:str) -> ByteStream:
+    if read_ahead and (ready := read_ahead.Take(filepath)): return ProfiledMappedByteStream(*ready) if uprofile.enabled else MappedByteStream(*ready)
+    file = open(filepath, 'rb')
+    if use_mmap and os.fstat(file.fileno()).st_size > 0: return ProfiledMappedByteStream(file) if uprofile.enabled else MappedByteStream(file)
+    return ProfiledByteStream(file) if uprofile.enabled else ByteStream(file)
+class ReadAhead: # Threads reading whole packages into anonymous mappings in the order an import will open them, so disk & network latency overlaps parsing
+    def __init__(self, filepaths):
+        self.queue = deque(dict.fromkeys(os.path.normcase(os.path.normpath(filepath)) for filepath in filepaths)) # Not yet read, in order
+        self.ready:dict[str,tuple] = {} # path -> (file, buf), read but not yet taken
+        self.reading:set[str] = set()
+        self.held, self.max_bytes = (0, read_ahead_max_mb * 1024 * 1024)
+        self.demand = None # Path the parser is waiting on, read next regardless of the bound
+        self.stopped = False
+        self.c_taken = self.c_waits = 0
+        self.cond = threading.Condition()
+        self.threads = [threading.Thread(target=self.Worker, name="uasset.ReadAhead", daemon=True) for i in range(min(read_ahead_threads, len(self.queue)))]
+        for thread in self.threads: thread.start()
+    def __repr__(self) -> str: return f"ReadAhead {len(self.queue)} Queued, {len(self.ready)} Ready ({self.held / (1024 * 1024):.1f} MB), {self.c_taken} Taken, {self.c_waits} Waited"
+    def Worker(self):
+        while True:
+            with self.cond:
+                while not self.stopped and not (self.queue and (self.held < self.max_bytes or self.demand in self.queue)): self.cond.wait()
+                if self.stopped: return
+                path = self.demand if self.demand in self.queue else self.queue[0]
+                self.queue.remove(path)
+                self.reading.add(path)
+            entry = self.ReadFile(path)
+            with self.cond:
+                self.reading.discard(path)
+                if entry and not self.stopped:
+                    self.ready[path] = entry
+                    self.held += len(entry[1])
+                elif entry: self.Release(entry)
+                self.cond.notify_all()
+    def ReadFile(self, path:str) -> tuple: # readinto releases the GIL, the parser keeps running meanwhile
+        try:
+            file = open(path, 'rb')
+            if not (size := os.fstat(file.fileno()).st_size):
+                file.close()
+                return None
+            buf = mmap.mmap(-1, size)
+            with memoryview(buf) as view:
+                pos = 0
+                while pos < size and (count := file.readinto(view[pos:])): pos += count
+            return (file, buf)
+        except OSError: return None
+    def Release(self, entry:tuple):
+        file, buf = entry
+        buf.close()
+        file.close()
+    def Take(self, filepath:str) -> tuple: # (file, buf) for MappedByteStream, waits if it's queued or being read, None when not planned
+        path = os.path.normcase(os.path.normpath(filepath))
+        with self.cond:
+            if path in self.queue or path in self.reading:
+                self.c_waits += 1
+                self.demand = path
+                self.cond.notify_all()
+                with uprofile.Span("ReadAhead.Wait", "io", package=filepath):
+                    while not self.stopped and (path in self.queue or path in self.reading): self.cond.wait()
+            if not (entry := self.ready.pop(path, None)): return None
+            self.held -= len(entry[1])
+            self.c_taken += 1
+            self.cond.notify_all()
+        uprofile.Count('read_ahead_hits', 1, filepath)
+        return entry
+    def Stop(self): # Unopened packages are dropped, later opens map the files again
+        with self.cond:
+            self.stopped = True
+            for entry in self.ready.values(): self.Release(entry)
+            self.ready.clear()
+            self.held = 0
+            self.cond.notify_all()
+read_ahead:ReadAhead = None # Set for the length of an import that reads ahead (umap)
 def StructToString(struct, names=True):
     structStr = ""
     comma = False
@@ -127,7 +371,30 @@ prop_table_types = { "ExpressionOutput", "ScalarParameterValue", "TextureParamet
 prop_table_blacklist = { "MaterialTextureInfo" }
 struct_map = { "Vector":FVector, "Rotator":FVector, "Vector4":FVector4, "IntPoint":FIntPoint, "Quat":FQuat, "Box":FBox, "Color":FColor, "LinearColor":FLinearColor, "BoxSphereBounds":FBoxSphereBounds }
 temp_struct_blacklist = set()
-uasset_cache = {}
+
+class PT: # Property type codes, tags dispatch on these instead of comparing type names
+    Unknown, Struct, Int, Object, Float, UInt, Name, Array, Bool, Str, Byte, Enum, MulticastDelegate, Map, Raw, Set = range(16)
+prop_type_codes = { "StructProperty":PT.Struct, "Int8Property":PT.Int, "Int16Property":PT.Int, "IntProperty":PT.Int, "Int64Property":PT.Int, "ObjectProperty":PT.Object,
+                    "FloatProperty":PT.Float, "DoubleProperty":PT.Float, "UInt16Property":PT.UInt, "UInt32Property":PT.UInt, "UInt64Property":PT.UInt, "NameProperty":PT.Name,
+                    "ArrayProperty":PT.Array, "BoolProperty":PT.Bool, "StrProperty":PT.Str, "ByteProperty":PT.Byte, "EnumProperty":PT.Enum, "MulticastDelegateProperty":PT.MulticastDelegate,
+                    "MapProperty":PT.Map, "TextProperty":PT.Raw, "MulticastSparseDelegateProperty":PT.Raw, "DelegateProperty":PT.Raw, "AssetObjectProperty":PT.Raw, "SetProperty":PT.Set }
+map_element_sizes = { "Int8Property":1, "Int16Property":2, "IntProperty":4, "Int64Property":8, "UInt16Property":2, "UInt32Property":4, "UInt64Property":8,
+                      "FloatProperty":4, "DoubleProperty":8, "ByteProperty":1 } # Container elements carry no tag, so no length
+class NameTable(list): # Package name map, FNames stay (index, number) pairs until a string is asked for
+    def __init__(self, names=()):
+        super().__init__(sys.intern(name) for name in names)
+        self.none = self.Find("None")
+        self.type_codes = [prop_type_codes.get(name, PT.Unknown) for name in self]
+        self.numbered:dict[tuple,str] = {}
+    def Find(self, name:str) -> int: # -1 if the package never references it
+        try: return self.index(name)
+        except ValueError: return -1
+    def Get(self, i_name, i) -> str:
+        if i == 0: return self[i_name]
+        if not (name := self.numbered.get((i_name, i))): self.numbered[(i_name, i)] = name = sys.intern(f"{self[i_name]}_{i - 1}")
+        return name
+    def IsNone(self, fname) -> bool: return fname[0] == self.none and fname[1] == 0
+    def __reduce__(self): return (NameTable, (list(self),))
 
 class ArrayDesc:
     def __init__(self, f:ByteStream, b32=True):
@@ -135,6 +402,10 @@ class ArrayDesc:
         #else: self.count, self.offset = (f.ReadInt64(), f.ReadInt64())
         if b32: self.count, self.offset = f.ReadStruct("ii", 8)
         else: self.count, self.offset = f.ReadStruct("qq", 16)
+    def Make(count, offset):
+        desc = object.__new__(ArrayDesc)
+        desc.count, desc.offset = (count, offset)
+        return desc
     def TrySeek(self, f:ByteStream) -> bool:
         valid = self.offset > 0 and self.count > 0
         if valid: f.Seek(self.offset)
@@ -148,62 +419,101 @@ class EngineVersion:
         self.changelist = changelist
         self.branch = branch
     def Read(f): return EngineVersion(f.ReadUInt16(), f.ReadUInt16(), f.ReadUInt16(), f.ReadUInt32(), f.ReadFString())
+def FNameFields(name): return [(name, '<i4'), (f'{name}_number', '<i4')]
+def ImportDType(version_ue4, editor=True) -> np.dtype: # FObjectImport, ObjectResource.cpp
+    fields = FNameFields('class_package') + FNameFields('class_name') + [('outer_index', '<i4')] + FNameFields('object_name')
+    if editor and version_ue4 >= 520: fields += FNameFields('package_name')
+    return np.dtype(fields)
+def ExportDType(version_ue4) -> np.dtype: # FObjectExport, ObjectResource.cpp
+    fields = [('class_index', '<i4'), ('super_index', '<i4')]
+    if version_ue4 >= 508: fields.append(('template_index', '<i4'))
+    fields += [('outer_index', '<i4')] + FNameFields('object_name') + [('object_flags', '<u4')]
+    fields += [('serial_size', '<i4'), ('serial_offset', '<i4')] if version_ue4 < 511 else [('serial_size', '<i8'), ('serial_offset', '<i8')]
+    fields += [('force_export', '<i4'), ('not_for_client', '<i4'), ('not_for_server', '<i4'), ('package_guid', 'V16'), ('package_flags', '<u4')]
+    if version_ue4 >= 365: fields.append(('not_always_loaded_for_editor', '<i4'))
+    if version_ue4 >= 465: fields.append(('is_asset', '<i4'))
+    if version_ue4 >= 507: fields.append(('depends', 'V20'))
+    return np.dtype(fields)
+def ToCacheJson(value): # USummary fields for the header cache, plain values pass through
+    if isinstance(value, ArrayDesc): return { '__desc__':[value.count, value.offset] }
+    if isinstance(value, uuid.UUID): return { '__guid__':str(value) }
+    if isinstance(value, EngineVersion): return { '__engine__':[value.major, value.minor, value.patch, value.changelist, value.branch] }
+    if isinstance(value, dict): return { '__dict__':[[ToCacheJson(k), ToCacheJson(v)] for k, v in value.items()] } # custom_versions, keyed by guid
+    return value
+def FromCacheJson(value):
+    if not isinstance(value, dict): return value
+    if '__desc__' in value: return ArrayDesc.Make(*value['__desc__'])
+    if '__guid__' in value: return uuid.UUID(value['__guid__'])
+    if '__engine__' in value: return EngineVersion(*value['__engine__'])
+    return { FromCacheJson(k):FromCacheJson(v) for k, v in value['__dict__'] }
+class LazyTable: # Import/Export objects built from their decoded table record on first access
+    def __init__(self, asset:UAsset, records:np.ndarray, ty):
+        self.asset, self.records, self.ty = (asset, records, ty)
+        self.fields = records.dtype.names
+        self.items = [None] * len(records)
+    def __len__(self): return len(self.items)
+    def __getitem__(self, i):
+        item = self.items[i]
+        if item is None: self.items[i] = item = self.ty(self.asset, dict(zip(self.fields, self.records[i].item())))
+        return item
+    def __iter__(self):
+        for i in range(len(self.items)): yield self[i]
 class Import: #FObjectImport
-    def __init__(self, asset:UAsset, editor=True): # ObjectResource.cpp
-        self.class_package = asset.f.ReadFName(asset.names)
-        self.class_name = asset.f.ReadFName(asset.names)
-        self.outer_index = asset.f.ReadInt32() # TODO: don't store
-        self.object_name = asset.f.ReadFName(asset.names)
-        if editor and asset.summary.version_ue4 >= 520: self.package_name = asset.f.ReadFName(asset.names)
+    def __init__(self, asset:UAsset, rec:dict):
+        self.class_package = asset.GetFName(rec['class_package'], rec['class_package_number'])
+        self.class_name = asset.GetFName(rec['class_name'], rec['class_name_number'])
+        self.outer_index = rec['outer_index'] # TODO: don't store
+        self.object_name = asset.GetFName(rec['object_name'], rec['object_name_number'])
+        if 'package_name' in rec: self.package_name = asset.GetFName(rec['package_name'], rec['package_name_number'])
         self.asset = asset
     @property
     def import_ref(self): return self.asset.TryGetImport(self.outer_index)
     def __repr__(self) -> str: return f"{self.object_name}({self.class_package}.{self.class_name})"
 class Export: #FObjectExport
-    def __init__(self, asset:UAsset):
+    def __init__(self, asset:UAsset, rec:dict):
         self.asset = asset
-        f = asset.f
-        self.class_index, self.super_index = f.ReadStruct('ii', 8)
-        if asset.summary.version_ue4 >= 508: self.template_index = f.ReadInt32()
-        self.outer_index = f.ReadInt32()
-        self.object_name = f.ReadFName(asset.names)
-        self.object_flags = f.ReadUInt32()
-        self.serial_desc = ArrayDesc(f, asset.summary.version_ue4 < 511)
-        self.force_export, self.not_for_client, self.not_for_server = f.ReadStruct('iii', 12)
-        self.package_guid = f.ReadGuid()
-        self.package_flags = f.ReadUInt32()
-        if asset.summary.version_ue4 >= 365: self.not_always_loaded_for_editor = f.ReadIntBool()
-        if asset.summary.version_ue4 >= 465: self.is_asset = f.ReadIntBool()
-        if asset.summary.version_ue4 >= 507:
-            f.Seek(20, io.SEEK_CUR)
-            '''vals = f.ReadStruct('iiiii', 20)
-            self.export_depends_offset = vals[0]
-            self.ser_before_ser_depends_size = vals[1]
-            self.create_before_ser_depends_size = vals[2]
-            self.ser_before_create_depends_size = vals[3]
-            self.create_before_create_depends_size = vals[4]'''
+        self.class_index, self.super_index = (rec['class_index'], rec['super_index'])
+        if 'template_index' in rec: self.template_index = rec['template_index']
+        self.outer_index = rec['outer_index']
+        self.object_name = asset.GetFName(rec['object_name'], rec['object_name_number'])
+        self.object_flags = rec['object_flags']
+        self.serial_desc = ArrayDesc.Make(rec['serial_size'], rec['serial_offset'])
+        self.force_export, self.not_for_client, self.not_for_server = (rec['force_export'], rec['not_for_client'], rec['not_for_server'])
+        self.package_guid = uuid.UUID(bytes_le=rec['package_guid'])
+        self.package_flags = rec['package_flags']
+        if 'not_always_loaded_for_editor' in rec: self.not_always_loaded_for_editor = rec['not_always_loaded_for_editor'] == 1
+        if 'is_asset' in rec: self.is_asset = rec['is_asset'] == 1
         
         self.properties = None
         self.export_class:Import = asset.DecodePackageIndex(self.class_index)
         self.export_class_type = self.export_class.object_name if self.export_class else None
     def __repr__(self) -> str: return f"{self.object_name} [{len(self.properties) if self.properties != None else 'Unread'}]"
     def ReadProperties(self, read_children=True, read_extras=False):
-        if self.properties: return
-        self.properties = Properties()
+        if self.properties:
+            if hasattr(self, 'properties_end'): # Read ahead, leave the stream where serialization continues
+                self.asset.f.EnsureOpen()
+                self.asset.f.Seek(self.properties_end)
+            return
+        self.properties = LazyProperties() if self.asset.lazy else Properties()
 
         if self.export_class_type in ('Function', 'FbxStaticMeshImportData') or self.export_class_type.endswith("BlueprintGeneratedClass"):
             print(f"Skipping Export \"{self.export_class_type}\"")
             return
         
-        #self.asset.f.EnsureOpen()
+        self.asset.f.EnsureOpen()
         self.asset.f.Seek(self.serial_desc.offset)
-        try: self.properties.Read(self.asset, read_children=read_children)
-        except Exception as e:
-            print(f"Failed reading properties ({os.path.basename(self.asset.filepath)}.{self}): {e}")
+        with uprofile.Span("ReadProperties", self.export_class_type):
+            try: self.properties.Read(self.asset, read_children=read_children)
+            except Exception as e:
+                print(f"Failed reading properties ({os.path.basename(self.asset.filepath)}.{self}): {e}")
+        self.properties_end = self.asset.f.Position()
+        if uprofile.enabled:
+            uprofile.Count('tags', len(self.properties), self.asset.filepath, self.export_class_type)
+            uprofile.Count('property_bytes', self.properties_end - self.serial_desc.offset, self.asset.filepath, self.export_class_type)
 
         extras_len = (self.serial_desc.offset + self.serial_desc.count) - self.asset.f.Position()
         assert extras_len >= 0
-        if read_extras: self.extras = [x for x in self.asset.f.ReadBytes(extras_len)] if extras_len > 0 else None
+        if read_extras: self.extras = self.asset.f.ReadBytes(extras_len) if extras_len > 0 else None
 class Properties(dict):
     def get(self, key:str, default=None) -> UProperty: return super().get(key, default)
     def Read(self, asset:UAsset, header=True, read_children=True):
@@ -226,24 +536,96 @@ class Properties(dict):
             export.ReadProperties(False)
             return export.properties
         return None
-class UProperty:
-    def __repr__(self) -> str: return f"{self.name}({self.struct_type if hasattr(self,'struct_type') else self.type}) = {self.value}"
-    def TryRead(self, asset:UAsset, header=True, read_children=True):
+class LazyProperties(Properties): # Only tag headers are scanned, values are decoded on first access
+    def __getitem__(self, key:str) -> UProperty:
+        prop = super().__getitem__(key)
+        if prop.dupes != None: self.Decode(prop)
+        return prop
+    def get(self, key:str, default=None) -> UProperty:
+        prop = super().get(key)
+        if prop == None: return default
+        if prop.dupes != None: self.Decode(prop)
+        return prop
+    def Add(self, prop:UProperty):
+        if existing := super().get(prop.name): existing.dupes.append(prop)
+        else:
+            prop.dupes = []
+            self[prop.name] = prop
+    def Read(self, asset:UAsset, header=True, read_children=True):
+        self.asset, self.read_children = (asset, read_children)
         f = asset.f
-        self.name = f.ReadFName(asset.names)
-        if self.name == "None": return None
+        p = f.Position()
+        if cached := asset.tag_cache.get(p): # Tag index from the header cache
+            tags, end = cached
+            for tag in tags:
+                prop = UProperty()
+                prop.name, prop.type, prop.type_code, prop.len, prop.i_dupe, prop.offset = tag
+                self.Add(prop)
+            f.Seek(end)
+            return self
+        while True:
+            prop = UProperty()
+            if not prop.TryReadTag(asset): break
+            prop.offset = f.Position()
+            prop.SkipData(asset)
+            self.Add(prop)
+        if cache_property_tags:
+            asset.tag_cache[p] = ([(tag.name, tag.type, tag.type_code, tag.len, tag.i_dupe, tag.offset) for prop in super().values() for tag in [prop] + prop.dupes], f.Position())
+            asset.header_cache_dirty = True
+        return self
+    def DecodeAll(self):
+        for prop in super().values():
+            if prop.dupes != None: self.Decode(prop)
+        return self
+    def Decode(self, prop:UProperty):
+        f = self.asset.f
+        f.EnsureOpen()
+        p = f.Position()
+        try:
+            for tag in [prop] + prop.dupes:
+                f.Seek(tag.offset)
+                tag.TryReadData(self.asset, True, self.read_children)
+                if tag != prop:
+                    if type(prop.value) != list: prop.value = [prop.value]
+                    prop.value.append(tag.value)
+        except Exception as e:
+            print(f"Failed reading property ({os.path.basename(self.asset.filepath)}.{prop.name}): {e}")
+            prop.value = None
+        finally:
+            prop.dupes = None
+            f.Seek(p)
+class UProperty:
+    dupes = None
+    def __repr__(self) -> str: return f"{self.name}({self.struct_type if hasattr(self,'struct_type') else self.type}) = {self.value if hasattr(self,'value') else 'Unread'}"
+    def TryReadTag(self, asset:UAsset):
+        f, names = (asset.f, asset.names)
+        i_name, i = f.ReadFNameIndex()
+        if i_name == names.none and i == 0: return False
 
-        self.type = f.ReadFName(asset.names)
+        self.name = names.Get(i_name, i)
+        i_type = f.ReadFNameIndex()[0]
+        self.type, self.type_code = (names[i_type], names.type_codes[i_type])
         self.len = f.ReadInt32()
         self.i_dupe = f.ReadInt32()
-        
+        return True
+    def TryRead(self, asset:UAsset, header=True, read_children=True):
+        if not self.TryReadTag(asset): return None
         return self.TryReadData(asset, header, read_children)
+    def SkipData(self, asset:UAsset): # Tag header remainder & payload, mirrors TryReadData's header reads
+        f = asset.f
+        match self.type_code:
+            case PT.Struct: f.Seek(24 if asset.summary.version_ue4 >= 441 else 8, io.SEEK_CUR)
+            case PT.Bool: f.Seek(1, io.SEEK_CUR)
+            case PT.Byte | PT.Enum | PT.Array | PT.Set: f.Seek(8, io.SEEK_CUR)
+            case PT.Map: f.Seek(16, io.SEEK_CUR)
+        asset.TryReadPropertyGuid()
+        f.Seek(self.len, io.SEEK_CUR)
     def TryReadData(self, asset:UAsset, header=True, read_children=True):
         assert self.type != "None"
         f = asset.f
         
-        match self.type:
-            case "StructProperty":
+        match self.type_code:
+            case PT.Struct:
                 if header:
                     self.struct_type = f.ReadFName(asset.names)
                     if asset.summary.version_ue4 >= 441: self.struct_guid = f.ReadGuid()
@@ -278,52 +660,53 @@ class UProperty:
                                     temp_struct_blacklist.add(self.struct_type)
                             if load_raw:
                                 f.Seek(p)
-                                self.value = [x for x in f.ReadBytes(self.len)]
+                                self.value = f.ReadBytes(self.len)
                                 if logging: print(f"Unknown Struct Type \"{self.struct_type}\"")
                             else: f.Seek(p_next)
                 p_diff = f.Position() - p_next
                 if p_diff != 0:
                     f.Seek(p)
-                    self.raw = [x for x in f.ReadBytes(self.len)]
+                    self.raw = f.ReadBytes(self.len)
                     if logging and self.struct_type != 'BoxSphereBounds': print(f"Length Mismatch! {self.struct_type} : {p_diff}")
                 
                 assert self.len > 0
-            case "Int8Property" | "Int16Property" | "IntProperty" | "Int64Property":
+            case PT.Int:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 match self.len:
                     case 1: self.value = f.ReadInt8()
                     case 2: self.value = f.ReadInt16()
                     case 4: self.value = f.ReadInt32()
                     case 8: self.value = f.ReadInt64()
-            case "ObjectProperty":
+            case PT.Object:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 self.value = asset.DecodePackageIndex(f.ReadInt32())
                 if read_children and self.value and type(self.value) is Export:
                     p = f.Position()
                     self.value.ReadProperties()
                     f.Seek(p)
-            case "FloatProperty" | "DoubleProperty":
+            case PT.Float:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 match self.len:
                     case 4: self.value = f.ReadFloat()
                     case 8: self.value = f.ReadDouble()
-            case "UInt16Property" | "UInt32Property" | "UInt64Property": # TODO: UInt8?
+            case PT.UInt: # TODO: UInt8?
                 if header: self.guid = asset.TryReadPropertyGuid()
                 match self.len:
                     case 2: self.value = f.ReadUInt16()
                     case 4: self.value = f.ReadUInt32()
                     case 8: self.value = f.ReadUInt64()
-            case "NameProperty":
+            case PT.Name:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 self.value = f.ReadFName(asset.names)
-            case "ArrayProperty": # | "MapProperty":
+            case PT.Array: # | "MapProperty":
                 #if self.type == "MapProperty": f.ReadBytes(8)
 
                 if header:
-                    self.array_type = f.ReadFName(asset.names)
+                    i_type = f.ReadFNameIndex()[0]
+                    self.array_type, self.array_type_code = (asset.names[i_type], asset.names.type_codes[i_type])
                     self.guid = asset.TryReadPropertyGuid()
                 element_count = f.ReadInt32()
-                if self.array_type == "StructProperty":
+                if self.array_type_code == PT.Struct:
                     if asset.summary.version_ue4 >= 500:
                         self.array_name = f.ReadFName(asset.names)
                         assert self.array_name != "None"
@@ -346,7 +729,7 @@ class UProperty:
                         for i in range(element_count):
                             prop = UProperty()
                             if single_prop:
-                                prop.name, prop.type, prop.struct_type, prop.len = ("", self.array_el_type, self.array_el_full_type, element_size)
+                                prop.name, prop.type, prop.type_code, prop.struct_type, prop.len = ("", self.array_el_type, self.array_type_code, self.array_el_full_type, element_size)
                                 if prop.TryReadData(asset, False, read_children): self.value.append(prop)
                             else:
                                 self.value.append(Properties().Read(asset))
@@ -363,15 +746,15 @@ class UProperty:
                     size_2 = int((self.len - 4) / element_count)
                     for i in range(element_count):
                         prop = UProperty()
-                        prop.name, prop.type, prop.len = ("", self.array_type, size_2)
+                        prop.name, prop.type, prop.type_code, prop.len = ("", self.array_type, self.array_type_code, size_2)
                         if prop.TryReadData(asset, False, read_children): self.value.append(prop)
-            case "BoolProperty":
+            case PT.Bool:
                 self.value = f.ReadBool()
                 if header: self.guid = asset.TryReadPropertyGuid()
-            case "StrProperty":
+            case PT.Str:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 self.value = f.ReadFString()
-            case "ByteProperty":
+            case PT.Byte:
                 if header:
                     self.enum_type = f.ReadFName(asset.names)
                     self.guid = asset.TryReadPropertyGuid()
@@ -379,27 +762,47 @@ class UProperty:
                     case 1: self.value = f.ReadUInt8()
                     case 8: self.value = f.ReadFName(asset.names)
                     case _: raise
-            case "EnumProperty":
+            case PT.Enum:
                 if header:
                     self.enum_type = f.ReadFName(asset.names)
                     self.guid = asset.TryReadPropertyGuid()
                 self.value = f.ReadFName(asset.names)
-            case "MulticastDelegateProperty":
+            case PT.MulticastDelegate:
                 if header: self.guid = asset.TryReadPropertyGuid()
                 self.value = []
                 for i in range(f.ReadInt32()): self.value.append((f.ReadInt32(), f.ReadFName(asset.names)))
-            case "MapProperty":
-                #if header: self.guid = asset.TryReadPropertyGuid()
-                self.value = [x for x in f.ReadBytes(self.len)]
-                #print("!")
+            case PT.Map: # Pairs stay raw, DecodeMap reads them on request
                 if header:
                     self.key_type = f.ReadFName(asset.names)
                     self.value_type = f.ReadFName(asset.names)
-            case "TextProperty" | "MulticastSparseDelegateProperty" | "DelegateProperty" | "AssetObjectProperty":
+                    self.guid = asset.TryReadPropertyGuid()
+                self.value_offset = f.Position()
+                self.value = f.ReadBytes(self.len)
+            case PT.Raw:
                 if header: self.guid = asset.TryReadPropertyGuid()
-                self.value = [x for x in f.ReadBytes(self.len)]
+                self.value = f.ReadBytes(self.len)
             case _: raise Exception(f"Uknown Property Type \"{self.type}\"")
         return True
+    def ReadMapElement(self, asset:UAsset, ty:str):
+        if prop_type_codes.get(ty) == PT.Struct: return Properties().Read(asset, read_children=False) # Struct type isn't serialized, assume a tagged property table
+        el = UProperty()
+        el.name, el.type, el.type_code, el.len = ("", ty, prop_type_codes.get(ty, PT.Unknown), map_element_sizes.get(ty, 0))
+        el.TryReadData(asset, False, False)
+        return el.value
+    def DecodeMap(self, asset:UAsset) -> list[tuple]: # Opt-in, (key, value) pairs of a MapProperty, decoded once from the file (MapProperty.cpp SerializeItem)
+        if hasattr(self, 'map'): return self.map
+        f = asset.f
+        f.EnsureOpen()
+        p = f.Position()
+        try:
+            f.Seek(self.value_offset)
+            for i in range(f.ReadInt32()): self.ReadMapElement(asset, self.key_type) # Keys to remove
+            self.map = [(self.ReadMapElement(asset, self.key_type), self.ReadMapElement(asset, self.value_type)) for i in range(f.ReadInt32())]
+        except Exception as e:
+            print(f"Failed decoding map ({self.name}): {e}")
+            self.map = None
+        finally: f.Seek(p)
+        return self.map
 class USummary:
     def __init__(self, asset:UAsset, editor=True): # UE4 PackageFileSummary.cpp
         f = asset.f
@@ -452,22 +855,43 @@ class USummary:
             for i in range(f.ReadInt32()): chunk_id = f.ReadInt32()
         elif version_ue4 >= 278: chunk_id = f.ReadInt32()
         if version_ue4 >= 507: self.preload_depends_desc = ArrayDesc(f)
+def FindEngineDir(engine_version:str):
+    if env_dir := os.environ.get(engine_dir_env): return env_dir
+    try: import winreg
+    except ImportError: return None
+    try: return os.path.join(winreg.QueryValueEx(winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, rf"SOFTWARE\EpicGames\Unreal Engine\{engine_version}"), "InstalledDirectory")[0], "Engine")
+    except OSError: pass
+    try: return os.path.join(winreg.QueryValueEx(winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"SOFTWARE\Epic Games\Unreal Engine\Builds"), engine_version)[0], "Engine") # Source builds, keyed by GUID
+    except OSError: return None
 class UProject:
     def __init__(self, uasset_path:str):
-        self.dir = uasset_path[:uasset_path.find("\\Content\\")]
-        uproject_file = next(glob.iglob(f'{self.dir}\\*.uproject'), None)
+        uasset_path = os.path.normpath(uasset_path)
+        i_content = uasset_path.find(f"{os.sep}Content{os.sep}")
+        self.dir = uasset_path[:i_content] if i_content >= 0 else os.path.dirname(uasset_path)
+        uproject_file = next(glob.iglob(os.path.join(glob.escape(self.dir), "*.uproject")), None)
+        engine_version = None
         if uproject_file:
-            with open(uproject_file, 'r') as file: engine_version = json.load(file)['EngineAssociation']
-            self.engine_dir = winreg.QueryValueEx(winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, rf"SOFTWARE\EpicGames\Unreal Engine\{engine_version}"), "InstalledDirectory")[0] + "\\Engine\\"
-        else: self.engine_dir = self.dir
+            with open(uproject_file, 'r') as file: engine_version = json.load(file).get('EngineAssociation')
+        self.engine_dir = FindEngineDir(engine_version) if engine_version else os.environ.get(engine_dir_env)
+        if not self.engine_dir:
+            if engine_version: print(f"Engine {engine_version} not found, set {engine_dir_env} to its Engine folder")
+            self.engine_dir = self.dir
+        self.registry = None # uregistry.AssetRegistry, optional
+    def __getstate__(self): return { **self.__dict__, 'registry':None }
+    def ToProjectPath(self, path:str):
+        if path.startswith("/Game/"): return os.path.join(self.dir, "Content", path[6:]) + ".uasset"
+        elif path.startswith("/Engine/"): return os.path.join(self.engine_dir, "Content", path[8:]) + ".uasset"
+        else: raise
 class UAsset:
-    def __init__(self, filepath:str, read_all=False, uproject=None):
+    def __init__(self, filepath:str, read_all=False, uproject=None, lazy=False):
         self.filepath = os.path.normpath(filepath)
         if uproject: self.uproject = uproject
         else: self.uproject = UProject(self.filepath)
         self.extract_dir = os.path.join(self.uproject.dir, "Export")
         self.read_all = read_all
-    def __repr__(self) -> str: return f"\"{self.f.byte_stream.name}\", {len(self.imports)} Imports, {len(self.exports)} Exports"
+        self.lazy = lazy
+    def __repr__(self) -> str: return f"\"{self.filepath}\", {len(self.imports)} Imports, {len(self.exports)} Exports"
+    def GetFName(self, i_name, i) -> str: return self.names.Get(i_name, i)
     def GetImport(self, i) -> Import: return self.imports[-i - 1]
     def GetExport(self, i) -> Export: return self.exports[i - 1]
     def TryGetImport(self, i): return self.GetImport(i) if i < 0 else None
@@ -476,10 +900,46 @@ class UAsset:
         if i < 0: return self.GetImport(i)
         elif i > 0: return self.GetExport(i)
         else: return None #raise Exception("Invalid Package Index of 0")
-    def ToProjectPath(self, path:str):
-        if path.startswith("/Game/"): return os.path.join(self.uproject.dir, "Content", path[6:]) + ".uasset"
-        elif path.startswith("/Engine/"): return os.path.join(self.uproject.engine_dir, "Content", path[8:]) + ".uasset"
-        else: raise
+    def ToProjectPath(self, path:str): return self.uproject.ToProjectPath(path)
+    def GetMainExport(self) -> Export:
+        main_export = None
+        package_name = os.path.splitext(os.path.basename(self.filepath))[0]
+        for export in self.exports:
+            if export.outer_index != 0: continue
+            if getattr(export, 'is_asset', False) or export.object_name == package_name: return export
+            if not main_export: main_export = export
+        return main_export
+    def GetPackageImports(self) -> set[str]: return { imp.object_name for imp in self.imports if imp.class_name == 'Package' }
+    def ReadExports(self, exports, read_children=True): # Properties of the unread exports in serial offset order, after one sequential pass over their ranges
+        for _ in self.RunReadExports(exports, read_children): pass
+    def RunReadExports(self, exports, read_children=True): # ReadExports in steps, yields after each export so callers can time slice it
+        exports = sorted((export for export in exports if export.properties is None), key=lambda export: export.serial_desc.offset)
+        self.PrefetchExportRanges(exports)
+        for export in exports:
+            export.ReadProperties(read_children)
+            yield
+    def PrefetchExportRanges(self, exports) -> int: # OS cache hint: reads the exports' ranges in file order into a scratch buffer, neighbours within read_coalesce_kb as one, so the mapping's faults don't seek
+        f = self.f
+        f.EnsureOpen()
+        if getattr(f, 'resident', False): return 0 # Already in memory (ReadAhead)
+        runs = []
+        for start, end in sorted((export.serial_desc.offset, export.serial_desc.offset + export.serial_desc.count) for export in exports if export.properties is None and export.serial_desc.count > 0):
+            if runs and start - runs[-1][1] <= read_coalesce_kb * 1024: runs[-1][1] = max(runs[-1][1], end)
+            else: runs.append([start, end])
+        if not runs: return 0
+        file = f.byte_stream
+        pos = file.tell() # ByteStream reads through the same handle
+        chunk = bytearray(min(read_chunk_mb * 1024 * 1024, max(end - start for start, end in runs)))
+        c_bytes = 0
+        with uprofile.Span("PrefetchExportRanges", "io", package=self.filepath, runs=len(runs)), memoryview(chunk) as view:
+            for start, end in runs:
+                file.seek(start)
+                while start < end and (count := file.readinto(view[:min(len(chunk), end - start)])):
+                    start += count
+                    c_bytes += count
+            file.seek(pos)
+        uprofile.Count('scheduled_bytes', c_bytes, self.filepath)
+        return c_bytes
     def EnsureIndexExports(self):
         if not hasattr(self, 'name2exp'):
             self.name2exp = {}
@@ -487,42 +947,182 @@ class UAsset:
 
     def TryReadPropertyGuid(self) -> uuid.UUID: return self.f.ReadGuid() if self.summary.version_ue4 >= 503 and self.f.ReadBool() else None
     #def TryReadProperty(self): # TODO
-    def Read(self, read_all=True, log=False): # PackageReader.cpp
-        t0 = time.time()
-        self.f = ByteStream(open(self.filepath, 'rb'))
+    def ReadHeader(self):
         self.summary = summary = USummary(self)
 
-        self.names:list[str] = []
-        if summary.names_desc.TrySeek(self.f):
-            for i in range(summary.names_desc.count):
-                name = self.f.ReadFString()
-                self.names.append(name)
-                if summary.version_ue4 >= 504 and name != "": hash = self.f.ReadUInt32()
+        self.names = NameTable(self.f.ReadNameTable(summary.names_desc.count, summary.version_ue4 >= 504) if summary.names_desc.TrySeek(self.f) else ())
         
-        self.imports:list[Import] = []
-        if summary.imports_desc.TrySeek(self.f):
-            for i in range(summary.imports_desc.count): self.imports.append(Import(self))
-        
-        self.exports:list[Export] = []
-        if summary.exports_desc.TrySeek(self.f):
-            for i in range(summary.exports_desc.count): self.exports.append(Export(self))
+        import_dtype = ImportDType(summary.version_ue4)
+        self.import_table = self.f.ReadRecords(import_dtype, summary.imports_desc.count) if summary.imports_desc.TrySeek(self.f) else np.empty(0, import_dtype)
+        export_dtype = ExportDType(summary.version_ue4)
+        self.export_table = self.f.ReadRecords(export_dtype, summary.exports_desc.count) if summary.exports_desc.TrySeek(self.f) else np.empty(0, export_dtype)
+    def HeaderCachePath(self): return os.path.join(self.extract_dir, "HeaderCache", hashlib.md5(os.path.normcase(self.filepath).encode()).hexdigest() + ".bin")
+    def TryLoadHeaderCache(self) -> bool: # Same layout as umeshcache: magic, header length, JSON header, then 64 byte aligned arrays
+        try:
+            with open(self.HeaderCachePath(), 'rb') as file: data = file.read()
+            if data[:4] != header_cache_magic: return False
+            header_len = unpack_from('<I', data, 4)[0]
+            header = json.loads(data[8:8 + header_len])
+            if header['version'] != header_cache_version or header['stamp'] != list(self.stamp): return False
+            summary = USummary.__new__(USummary)
+            for name, value in header['summary'].items(): setattr(summary, name, FromCacheJson(value))
+            data_start = (8 + header_len + 63) & ~63
+            arrays = { name:np.frombuffer(data, dtype, count, data_start + offset) for (name, count, offset), dtype in zip(header['arrays'], (ImportDType(summary.version_ue4), ExportDType(summary.version_ue4), np.dtype('<i8'), np.dtype('<i8'))) }
+            strings = [sys.intern(string) for string in header['tag_strings']]
+            rows, tag_cache, i_row = (arrays['tag_rows'].reshape(-1, 6).tolist(), {}, 0)
+            for p, end, count in arrays['tag_spans'].reshape(-1, 3).tolist():
+                tag_cache[p] = ([(strings[i_name], strings[i_type], type_code, length, i_dupe, offset) for i_name, i_type, type_code, length, i_dupe, offset in rows[i_row:i_row + count]], end)
+                i_row += count
+            self.summary, self.names, self.import_table, self.export_table, self.tag_cache = (summary, NameTable(header['names']), arrays['imports'], arrays['exports'], tag_cache)
+            return True
+        except Exception: return False
+    def SaveHeaderCache(self):
+        strings:dict[str,int] = {}
+        spans, rows = ([], [])
+        for p, (tags, end) in self.tag_cache.items():
+            spans.append((p, end, len(tags)))
+            rows += [(strings.setdefault(name, len(strings)), strings.setdefault(ty, len(strings)), type_code, length, i_dupe, offset) for name, ty, type_code, length, i_dupe, offset in tags]
+        arrays = { 'imports':self.import_table, 'exports':self.export_table, 'tag_spans':np.array(spans, '<i8').reshape(-1, 3), 'tag_rows':np.array(rows, '<i8').reshape(-1, 6) }
+        header = { 'version':header_cache_version, 'stamp':list(self.stamp), 'summary':{ name:ToCacheJson(value) for name, value in vars(self.summary).items() }, 'names':list(self.names), 'tag_strings':list(strings), 'arrays':[] }
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'].append((name, array.size, offset))
+            offset = (offset + array.nbytes + 63) & ~63
+        header_bytes = json.dumps(header, separators=(',', ':')).encode()
+        data_start = (8 + len(header_bytes) + 63) & ~63
+        cache_path = self.HeaderCachePath()
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path + ".tmp", 'wb') as file:
+                file.write(header_cache_magic + pack('<I', len(header_bytes)) + header_bytes)
+                for array, (name, count, array_offset) in zip(arrays.values(), header['arrays']):
+                    file.seek(data_start + array_offset)
+                    file.write(np.ascontiguousarray(array).data)
+                file.truncate(data_start + offset)
+            os.replace(cache_path + ".tmp", cache_path)
+            self.header_cache_dirty = False
+        except OSError as e: print(f"Failed writing header cache for \"{self.filepath}\": {e}")
+    def Read(self, read_all=True, log=False): # PackageReader.cpp
+        t0 = time.time()
+        self.f = OpenByteStream(self.filepath)
+        file_stat = os.fstat(self.f.byte_stream.fileno())
+        self.stamp = (file_stat.st_size, file_stat.st_mtime_ns)
+        self.tag_cache:dict[int,tuple] = {}
+        self.header_cache_dirty = False
+        with uprofile.Span("ReadHeader", "uasset", package=self.filepath):
+            if not (use_header_cache and self.TryLoadHeaderCache()):
+                self.ReadHeader()
+                self.header_cache_dirty = use_header_cache
+                uprofile.Count('header_cache_misses', 1, self.filepath)
+            else: uprofile.Count('header_cache_hits', 1, self.filepath)
+        summary = self.summary
+        self.imports:LazyTable[Import] = LazyTable(self, self.import_table, Import)
+        self.exports:LazyTable[Export] = LazyTable(self, self.export_table, Export)
 
         if read_all and summary.header_size > 0 and summary.exports_desc.count > 0:
             for export in self.exports: export.ReadProperties(False)
-            self.f.byte_stream.close()
+            self.Close()
             if log: print(f"Imported {self} in {time.time() - t0:.2f}s")
-    def Close(self):
-        try: self.f.byte_stream.close()
-        except: pass
+    def CloseHandle(self): # Flushes the header & tag cache and releases the stream, the parsed package stays usable and remaps on demand
+        if use_header_cache and getattr(self, 'header_cache_dirty', False): self.SaveHeaderCache()
+        if f := getattr(self, 'f', None): f.Close()
+    def Close(self): self.CloseHandle()
+    def __getstate__(self): # Parsed packages cross process boundaries (uprefetch pool) without their stream
+        state = self.__dict__.copy()
+        state.pop('f', None)
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.f = OpenByteStream(self.filepath)
+        self.f.Close() # Reopened on demand
+    def EstimateMemory(self) -> int: # Rough resident size, decoded property trees run several times their serialized size
+        size = self.import_table.nbytes + self.export_table.nbytes + 64 * len(self.names)
+        if (f := getattr(self, 'f', None)) and getattr(f, 'resident', False) and not f.byte_stream.closed: size += len(f.buf) # Whole package read into memory (ReadAhead), released with the handle
+        for export in self.exports.items:
+            if export is None: continue
+            size += 512
+            if export.properties != None: size += 4 * export.serial_desc.count
+            if mesh_data := getattr(export, 'mesh_data', None): size += DataSize(mesh_data)
+        return size
     def __enter__(self):
-        '''cached = uasset_cache.get(self.filepath)
-        if cached:
-            self = cached
-        else:
-            uasset_cache[self.filepath] = self'''
+        if cached := uasset_cache.Get(self.filepath):
+            if cached.lazy and not self.lazy: # Eager callers walk values without TryGetValue, decode what was read & read the rest eagerly
+                for export in cached.exports:
+                    if isinstance(export.properties, LazyProperties): export.properties.DecodeAll()
+                cached.lazy = False
+            if self.read_all and not cached.read_all:
+                for export in cached.exports: export.ReadProperties(False)
+                cached.read_all = True
+            return cached
         self.Read(self.read_all)
+        uasset_cache.Put(self)
         return self
-    def __exit__(self, *args): self.Close()
+    def __exit__(self, *args):
+        if not uasset_cache.Contains(self): self.Close()
+
+def DataSize(data) -> int:
+    if isinstance(data, np.ndarray): return data.nbytes
+    if isinstance(data, dict): return sum(DataSize(v) for v in data.values())
+    if isinstance(data, (list, tuple)): return sum(DataSize(v) for v in data) + 8 * len(data)
+    return 16
+class UAssetCache: # Session wide LRU of parsed packages, keyed by normalized path & file stamp
+    def __init__(self, max_open=128, max_mb=2048):
+        self.assets:OrderedDict[str,UAsset] = OrderedDict()
+        self.sizes:dict[str,int] = {}
+        self.max_open, self.max_bytes = (max_open, max_mb * 1024 * 1024)
+        self.hits = self.misses = 0
+    def __len__(self): return len(self.assets)
+    def Key(self, filepath:str): return os.path.normcase(os.path.normpath(filepath))
+    def Contains(self, asset:UAsset): return self.assets.get(self.Key(asset.filepath)) is asset
+    def Get(self, filepath:str) -> UAsset:
+        key = self.Key(filepath)
+        if not (asset := self.assets.get(key)): 
+            self.misses += 1
+            return None
+        try: file_stat = os.stat(filepath)
+        except OSError: file_stat = None
+        if not file_stat or (file_stat.st_size, file_stat.st_mtime_ns) != asset.stamp: # Changed on disk
+            self.Remove(filepath)
+            self.misses += 1
+            return None
+        self.assets.move_to_end(key)
+        self.hits += 1
+        uprofile.Count('asset_cache_hits', 1, filepath)
+        return asset
+    def Put(self, asset:UAsset):
+        if not use_asset_cache: return
+        key = self.Key(asset.filepath)
+        if (old := self.assets.get(key)) and old is not asset: old.Close()
+        self.assets[key] = asset
+        self.assets.move_to_end(key)
+        self.sizes[key] = asset.EstimateMemory()
+        self.Trim()
+    def Remove(self, filepath:str):
+        key = self.Key(filepath)
+        if asset := self.assets.pop(key, None): asset.Close()
+        self.sizes.pop(key, None)
+    def Trim(self):
+        c_open = 0
+        for key, asset in reversed(self.assets.items()): # Least recently used streams are closed first, they remap on demand and release read ahead buffers
+            if not hasattr(asset, 'f') or asset.f.byte_stream.closed: continue
+            c_open += 1
+            if c_open > self.max_open:
+                asset.CloseHandle()
+                self.sizes[key] = asset.EstimateMemory()
+        total = sum(self.sizes.values())
+        while total > self.max_bytes and len(self.assets) > 1:
+            key = next(iter(self.assets))
+            total -= self.sizes.get(key, 0)
+            self.Remove(key)
+    def CloseHandles(self): # End of an import, keep parsed packages but release files
+        for key, asset in self.assets.items():
+            asset.CloseHandle()
+            self.sizes[key] = asset.EstimateMemory()
+    def Clear(self):
+        for key in list(self.assets): self.Remove(key)
+        self.hits = self.misses = 0
+    def Report(self): print(f"UAsset Cache: {len(self.assets)} Packages, ~{sum(self.sizes.values()) / (1024 * 1024):.1f} MB, {self.hits} Hits, {self.misses} Misses")
+uasset_cache = UAssetCache()
 
 if __name__ != "uasset":
     #asset = UAsset(r"F:\Projects\Unreal Projects\Assets\Content\ModSci_Engineer\Materials\M_Base_Trim.uasset")
@@ -0,0 +1,162 @@
+import os, sys, time, json, shutil, tempfile, argparse, platform
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+
+import uasset, udecode, umeshcache, usynth
+from uasset import UAsset, USummary, UProject
+
+# Parser micro-benchmarks on usynth packages, no bpy: python -m ubench [--quick] [--save] [--check 0.8]
+baselines_path = os.path.join(cur_dir, "ubench_baselines.json")
+reps = 5 # Best of, parsing is deterministic so the minimum is the least noisy
+
+class Bench:
+    def __init__(self, name:str, make, run, size:str):
+        self.name, self.make, self.run, self.size = (name, make, run, size)
+    def __repr__(self) -> str: return f"{self.name}[{self.size}]"
+    def Key(self): return f"{self.name}/{self.size}"
+
+def Open(filepath:str, uproject:UProject) -> UAsset:
+    asset = UAsset(filepath, uproject=uproject)
+    asset.Read(False)
+    return asset
+
+def RunSummary(filepath:str, uproject:UProject): # USummary alone, repeated over one mapping
+    asset = UAsset(filepath, uproject=uproject)
+    asset.f = f = uasset.OpenByteStream(filepath)
+    count = 1000
+    t0 = time.perf_counter()
+    for i in range(count):
+        f.Seek(0)
+        asset.summary = USummary(asset)
+    t = time.perf_counter() - t0
+    size = f.Position()
+    f.Close()
+    return t, { 'MB/s':count * size, 'summaries/s':count }
+def RunTables(filepath:str, uproject:UProject): # Summary, name map & import/export records, then every Import/Export built
+    t0 = time.perf_counter()
+    asset = Open(filepath, uproject)
+    for imp in asset.imports: pass
+    for export in asset.exports: pass
+    t = time.perf_counter() - t0
+    asset.Close()
+    return t, { 'MB/s':asset.summary.header_size, 'names/s':len(asset.names), 'records/s':len(asset.imports) + len(asset.exports) }
+def RunProperties(filepath:str, uproject:UProject): # Properties.Read over every export
+    asset = Open(filepath, uproject)
+    t0 = time.perf_counter()
+    c_tags = size = 0
+    for export in asset.exports:
+        export.ReadProperties(False)
+        c_tags += len(export.properties)
+        size += export.serial_desc.count
+    t = time.perf_counter() - t0
+    asset.Close()
+    return t, { 'MB/s':size, 'tags/s':c_tags }
+def RunStaticMesh(filepath:str, uproject:UProject): # FRawMesh bulk data
+    asset = Open(filepath, uproject)
+    export = asset.exports[0]
+    t0 = time.perf_counter()
+    udecode.DecodeStaticMesh(export)
+    t = time.perf_counter() - t0
+    asset.Close()
+    raw = export.mesh_data['raw']
+    return t, { 'MB/s':asset.stamp[0], 'verts/s':len(raw['wedge_indices']) } # Wedges, what the builder consumes per vertex
+def RunSkeletalMesh(filepath:str, uproject:UProject): # FStaticLODModel vertex & index buffers
+    asset = Open(filepath, uproject)
+    export = asset.exports[0]
+    t0 = time.perf_counter()
+    udecode.DecodeSkeletalMesh(export)
+    t = time.perf_counter() - t0
+    asset.Close()
+    return t, { 'MB/s':asset.stamp[0], 'verts/s':len(export.mesh_data['lod']['positions']) }
+def RunMeshCache(filepath:str, uproject:UProject): # Warm umeshcache.Load of a decoded static mesh, against static_mesh's decode
+    if not umeshcache.IsValid(filepath, uproject):
+        asset = Open(filepath, uproject)
+        export = asset.exports[0]
+        umeshcache.Save(filepath, uproject, export.export_class_type, export.object_name, udecode.DecodeStaticMesh(export), stamp=asset.stamp)
+        asset.Close()
+    t0 = time.perf_counter()
+    cached = umeshcache.Load(filepath, uproject)
+    t = time.perf_counter() - t0
+    return t, { 'MB/s':os.path.getsize(umeshcache.CachePath(filepath, uproject)), 'verts/s':len(cached['data']['raw']['wedge_indices']) }
+def RunInstances(filepath:str, uproject:UProject): # PerInstanceSMData of a foliage component
+    asset = Open(filepath, uproject)
+    export = next(export for export in asset.exports if export.export_class_type == 'FoliageInstancedStaticMeshComponent')
+    t0 = time.perf_counter()
+    instances = udecode.DecodeInstances(export)
+    t = time.perf_counter() - t0
+    asset.Close()
+    return t, { 'MB/s':export.serial_desc.count, 'instances/s':len(instances) }
+
+def MakeBenches(quick=False) -> list[Bench]:
+    benches = []
+    for size, actors, tris, verts in (("small", 100, 10000, 10000), ("large", 2000, 200000, 200000))[:1 if quick else 2]:
+        benches += [
+            Bench("summary", lambda: usynth.SynthMapPackage(10), RunSummary, size),
+            Bench("tables", lambda actors=actors: usynth.SynthMapPackage(actors, 4, extra_names=10 * actors, extra_imports=actors), RunTables, size),
+            Bench("properties", lambda actors=actors: usynth.SynthMapPackage(actors, 20), RunProperties, size),
+            Bench("properties_mixed", lambda actors=actors: usynth.SynthMapPackage(actors, 20, prop_mix=usynth.prop_kinds), RunProperties, size),
+            Bench("static_mesh", lambda tris=tris: usynth.SynthStaticMeshPackage(tris), RunStaticMesh, size),
+            Bench("skeletal_mesh", lambda verts=verts: usynth.SynthSkeletalMeshPackage(verts), RunSkeletalMesh, size),
+            Bench("mesh_cache", lambda tris=tris: usynth.SynthStaticMeshPackage(tris), RunMeshCache, size),
+            Bench("instances", lambda verts=verts: usynth.SynthMapPackage(0, foliage_instances=verts), RunInstances, size),
+        ]
+    return benches
+
+def Run(benches:list[Bench], log=True) -> dict[str,dict]:
+    uasset.use_header_cache = uasset.use_asset_cache = uasset.logging = False # Measure parsing, not cache hits
+    tmp_dir = tempfile.mkdtemp(prefix="ubench")
+    uproject = UProject.__new__(UProject)
+    uproject.dir = uproject.engine_dir = tmp_dir
+    uproject.registry = None
+    results = {}
+    try:
+        for bench in benches:
+            filepath = bench.make().Save(os.path.join(tmp_dir, "Content", "Synth", f"{bench.name}_{bench.size}.uasset"))
+            best = None
+            for i in range(reps):
+                t, counts = bench.run(filepath, uproject)
+                if not best or t < best[0]: best = (t, counts)
+            t, counts = best
+            results[bench.Key()] = metrics = { unit:(count / (1024 * 1024) if unit == 'MB/s' else count) / t for unit, count in counts.items() }
+            metrics['ms'] = t * 1000
+            if log: print(f"{bench.Key():<26} {metrics['ms']:10.3f}ms  " + "  ".join(f"{v:14,.1f} {unit}" for unit, v in metrics.items() if unit != 'ms'))
+    finally: shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+def LoadBaselines(path=baselines_path) -> dict:
+    try:
+        with open(path, 'r') as file: return json.load(file)
+    except (OSError, ValueError): return {}
+def SaveBaselines(results:dict, path=baselines_path):
+    baselines = LoadBaselines(path)
+    baselines.update({ 'machine':f"{platform.system()} {platform.machine()}, Python {platform.python_version()}", 'results':{ **baselines.get('results', {}), **{ key:{ unit:round(v, 3) for unit, v in metrics.items() } for key, metrics in results.items() } } })
+    with open(path, 'w') as file: json.dump(baselines, file, indent=1, sort_keys=True)
+def Compare(results:dict, baselines:dict, threshold=0.0) -> list[str]: # Regressions, throughput below threshold * baseline
+    regressions = []
+    base_results = baselines.get('results', {})
+    print(f"\nAgainst baselines ({baselines.get('machine', 'none stored')}):")
+    for key, metrics in results.items():
+        if not (base := base_results.get(key)): continue
+        ratios = { unit:v / base[unit] for unit, v in metrics.items() if unit != 'ms' and base.get(unit) }
+        print(f"{key:<26} " + "  ".join(f"{unit} {r:5.2f}x" for unit, r in ratios.items()))
+        if any(r < threshold for r in ratios.values()): regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ubench", description="Time the package parser on synthetic packages against stored baselines")
+    parser.add_argument('--quick', action='store_true', help="Small sizes only")
+    parser.add_argument('--filter', default="", help="Only benches whose name contains this")
+    parser.add_argument('--save', action='store_true', help=f"Store the results as the new baselines ({os.path.basename(baselines_path)})")
+    parser.add_argument('--check', type=float, default=0.0, help="Exit 1 if any throughput falls below this fraction of its baseline")
+    args = parser.parse_args(argv)
+
+    results = Run([bench for bench in MakeBenches(args.quick) if args.filter in bench.name])
+    regressions = Compare(results, LoadBaselines(), args.check)
+    if args.save: SaveBaselines(results)
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__": sys.exit(main())
@@ -0,0 +1,437 @@
+import os, io, sys, uuid
+import numpy as np
+from ctypes import *
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+import uasset, uprofile
+from uasset import UAsset, Export, FStripDataFlags, FVector, FVector4, FVector2D, FColor, PrintableStruct
+
+# Mesh decoding without bpy, results are plain arrays that pickle across processes (uprefetch pool) and are turned into datablocks by umesh
+
+class FApexClothPhysToRenderVertData(PrintableStruct): _fields_ = ( ('pos_bary_d', FVector4), ('normal_bary_d', FVector4), ('tang_bary_d', FVector4), ('simul_mesh_vert_inds', c_int16 * 4), ('pad', c_int32 * 2) )
+class FPackedNormal(PrintableStruct):
+    _fields_ = ( ('packed', c_uint32), )
+    def Unpack(self):
+        # TODO: Handle 4.20: ^ 0b10000000100000001000000010000000 # offset by 128
+        return ( # Y, X, Z
+            ((self.packed >> 8 ) & 0xFF) / 127.5 - 1,
+            ( self.packed        & 0xFF) / 127.5 - 1,
+            ((self.packed >> 16) & 0xFF) / 127.5 - 1
+        )
+class BulkHeader:
+    def Read(self, f:uasset.ByteStream, summary:uasset.USummary):
+        self.flags = f.ReadUInt32()
+        b64 = self.flags & 0x2000 # Size64Bit
+        assert not b64
+        self.count = f.ReadUInt64() if b64 else f.ReadUInt32()
+        self.byte_size = f.ReadUInt64() if b64 else f.ReadUInt32()
+        self.offset = f.ReadInt32() if summary.version_ue4 < 198 else f.ReadInt64()
+        if not (self.flags & 0x10000): self.offset += summary.bulk_data_offset # NoOffsetFixUp
+        return self
+    def SkipInline(self, f:uasset.ByteStream): # FUntypedBulkData::Serialize, the payload follows the header unless it's at the end of the file or in another
+        if not (self.flags & (0x1 | 0x100)): f.Seek(self.byte_size, mode=io.SEEK_CUR) # BULKDATA_PayloadAtEndOfFile | BULKDATA_PayloadInSeperateFile
+        return self
+
+v_obj_guid     = uuid.UUID('E4B068ED-42E9-F494-0BDA-31A241BB462E') # 0xE4B068ED, 0xF49442E9, 0xA231DA0B, 0x2E46BB41
+v_ent_obj_guid = uuid.UUID('9DFFBCD6-0158-494F-8212-21E288A8923C') # 0x9DFFBCD6, 0x494F0158, 0xE2211282, 0x3C92A888
+v_tang_guid    = uuid.UUID('5579F886-4C1F-933A-7B08-BA832FB96163') #
+v_ren_guid     = uuid.UUID('12F88B9F-4AFC-8875-0CD9-7CA629BD3A38') # 0x12F88B9F, 0x88754AFC, 0xA67CD90C, 0x383ABD29
+v_skel_guid    = uuid.UUID('D78A4A00-4697-E858-B519-A8BAB4467D48') # 0xD78A4A00, 0xE8584697, 0xBAA819B5, 0x487D46B4
+v_fn_main_guid = uuid.UUID('601D1886-4F84-AC64-DED3-16AAD6C7EA0D') # 0x601D1886, 0xAC644F84, 0xAA16D3DE, 0x0DEAC7D6
+
+dt_vec2, dt_vec3, dt_color = (np.dtype((np.float32, 2)), np.dtype((np.float32, 3)), np.dtype((np.uint8, 4)))
+
+lod_lowest_poly = -1 # lod argument for the LOD with the fewest triangles, for proxy & preview imports
+
+def SelectLOD(tri_counts:list, lod:int): # tri_counts per LOD, None where it has nothing to import. Past the last available LOD falls back to it
+    available = [i for i, c in enumerate(tri_counts) if c is not None]
+    if not available: return None
+    if lod == lod_lowest_poly: return min(available, key=lambda i: tri_counts[i])
+    return max((i for i in available if i <= lod), default=available[0])
+
+def ReadStripFlags(f:uasset.ByteStream, summary:uasset.USummary, min_v = 130) -> FStripDataFlags: return f.ReadStructure(FStripDataFlags) if summary.version_ue4 >= min_v else FStripDataFlags()
+def ReadFMultisizeIndexContainer(f:uasset.ByteStream, summary:uasset.USummary, skip=False):
+    if summary.version_ue4 < 283: need_cpu_access = f.ReadBool32() # VER_UE4_KEEP_SKEL_MESH_INDEX_DATA
+    size = f.ReadUInt8()
+    el_size = f.ReadInt32() # ReadBulkArray
+    if skip: return f.SkipArray(c_uint16 if size == 2 else c_uint32)
+    return ReadArrayNp(f, np.dtype(np.uint16 if size == 2 else np.uint32))
+def ReadArrayNp(f:uasset.ByteStream, dtype:np.dtype) -> np.ndarray: return f.ReadRecords(dtype, f.ReadInt32())
+def ReadArrayView(f:uasset.ByteStream, dtype:np.dtype) -> np.ndarray: return f.ReadView(dtype, f.ReadInt32())
+def ToBlenderPositions(v:np.ndarray) -> np.ndarray: # UE cm, X forward left handed -> Blender m, swapped X/Y
+    v = np.take(v, (1, 0, 2), axis=1) # C contiguous copy, fancy indexing would leave it Fortran ordered
+    v *= np.float32(0.01)
+    return v
+def ToBlenderNormals(n:np.ndarray) -> np.ndarray: return np.take(n, (1, 0, 2), axis=1)
+def ToBlenderUVs(uv:np.ndarray) -> np.ndarray: # V down -> V up
+    uv = uv.astype(np.float32) # Also widens FMeshUVHalf
+    uv[..., 1] = 1 - uv[..., 1]
+    return uv
+def UnpackNormals(packed:np.ndarray) -> np.ndarray: # FPackedNormal.Unpack over a uint32 array, already Y, X, Z
+    # TODO: Handle 4.20: ^ 0b10000000100000001000000010000000 # offset by 128
+    n = ((packed[:, None] >> np.array((8, 0, 16), np.uint32)) & 0xFF).astype(np.float32) # Works on strided record fields
+    n /= np.float32(127.5)
+    n -= 1
+    return n
+def GPUSkinVertexDtype(skel_infl_c:int, uv_c:int, float_uvs:bool, inline_weights:bool) -> np.dtype: # TGPUSkinVertexFloat16Uvs / TGPUSkinVertexFloat32Uvs
+    fields = [('tangent_x', '<u4'), ('tangent_z', '<u4')]
+    if inline_weights: fields += [('bone_indices', 'u1', skel_infl_c), ('bone_weights', 'u1', skel_infl_c)] # FSkinWeightInfo
+    return np.dtype(fields + [('pos', '<f4', 3), ('uvs', '<f4' if float_uvs else '<f2', (uv_c, 2))])
+def MapChunkBones(bone_indices:np.ndarray, chunks:list) -> np.ndarray: # Chunk local bone indices -> reference skeleton, through each chunk's bone map
+    bones = np.zeros(bone_indices.shape, np.int32)
+    i_vert = 0
+    for rigid_vert_c, soft_vert_c, bone_map in chunks:
+        end = i_vert + rigid_vert_c + soft_vert_c
+        bones[i_vert:end] = np.asarray(bone_map, np.int32)[bone_indices[i_vert:end]]
+        i_vert = end
+    return bones
+def UniqueTriangles(tris:np.ndarray) -> np.ndarray: # Indices of the first of each set of faces sharing the same verts, degenerates dropped (what bmesh.faces.new rejects)
+    a, b, c = (tris[:, 0].astype(np.int64), tris[:, 1].astype(np.int64), tris[:, 2].astype(np.int64))
+    lo, hi = (np.minimum(np.minimum(a, b), c), np.maximum(np.maximum(a, b), c))
+    mid = a + b + c - lo - hi
+    valid = np.flatnonzero((lo != mid) & (mid != hi))
+    lo, mid, hi = (lo[valid], mid[valid], hi[valid])
+    if len(valid) == 0: return valid
+    if hi.max() >= (1 << 21): return valid[np.sort(np.unique(np.stack((lo, mid, hi), 1), axis=0, return_index=True)[1])]
+    keys = (lo << 42) | (mid << 21) | hi # Packed, much faster to sort than rows
+    order = np.argsort(keys)
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    if len(starts) == len(keys): return valid # No duplicates
+    first = np.minimum.reduceat(order, starts) # Unstable sort, so the earliest face of each group is its minimum index
+    first.sort()
+    return valid[first]
+def IsRawMeshDecodable(bulk:BulkHeader): # FByteBulkData with an FRawMesh we can reach
+    if bulk.flags & 0x20 or bulk.count == 0: return False # BULKDATA_Unused, No data
+    assert not (bulk.flags & (0x100 | 0x800)) # PayloadInSeperateFile | OptionalPayload
+    return bool(bulk.flags & 0x1) # PayloadAtEndOfFile
+def RawMeshFaceCount(f:uasset.ByteStream, bulk:BulkHeader): # FRawMesh::FaceMaterialIndices.Num(), peeked without decoding
+    p = f.Position()
+    f.Seek(bulk.offset + 8)
+    count = f.ReadInt32()
+    f.Seek(p)
+    return count
+def DecodeRawMesh(asset:UAsset, f:uasset.ByteStream, bulk:BulkHeader): # FByteBulkData payload at the end of the file, see IsRawMeshDecodable
+    assert bulk.offset + 16 <= os.fstat(f.byte_stream.raw.fileno()).st_size, "Offset is outside file"
+    p = f.Position()
+
+    # FByteBulkData::SerializeData
+    assert asset.summary.compression_flags == 0
+    f.Seek(bulk.offset)
+
+    if bulk.flags & (0x02 | 0x10 | 0x80): raise Exception("CompressedZlib | CompressedLzo | CompressedLzx Unsupported")
+
+    # FRawMesh
+    uprofile.Count('bulk_bytes', bulk.byte_size, asset.filepath, 'StaticMesh')
+    raw = {}
+    version, version_licensee = (f.ReadInt32(), f.ReadInt32())
+    # Arrays converted to Blender space are read as views of the payload, so each is materialized once
+    raw['face_mat_indices'] = ReadArrayNp(f, np.dtype(np.int32))
+    f.SkipArray(c_uint32)#face_smoothing_mask = f.ReadArray(c_uint32)
+    raw['vertices'] = ToBlenderPositions(ReadArrayView(f, dt_vec3))
+    raw['wedge_indices'] = ReadArrayNp(f, np.dtype(np.int32))
+    f.SkipArray(FVector)#wedge_tangents = f.ReadArray(FVector)
+    f.SkipArray(FVector)#wedge_binormals = f.ReadArray(FVector)
+    raw['wedge_normals'] = ToBlenderNormals(ReadArrayView(f, dt_vec3))
+    raw['wedge_uvs'] = [] # (channel, uvs), empty channels dropped
+    for i_uv in range(8):
+        if len(wedge_uv := ReadArrayView(f, dt_vec2)) > 0: raw['wedge_uvs'].append((i_uv, ToBlenderUVs(wedge_uv)))
+    raw['wedge_colors'] = np.take(ReadArrayView(f, dt_color), (2, 1, 0, 3), axis=1) # BGRA -> RGBA
+    if version >= 1: mat_index_to_import_index = f.ReadArray(c_int32)
+
+    f.Seek(p)
+    return raw
+@uprofile.Spanned("bulk")
+def DecodeStaticMesh(self:Export, lod=0):
+    asset = self.asset
+    f = self.asset.f
+
+    self.ReadProperties(False, False)
+    if f.ReadInt32(): self.guid = f.ReadGuid()
+
+    strip_flags = ReadStripFlags(f, asset.summary)
+    cooked = f.ReadBool32()
+    body_setup = asset.DecodePackageIndex(f.ReadInt32())
+    if asset.summary.version_ue4 >= 216: nav_collision = asset.DecodePackageIndex(f.ReadInt32())
+
+    editor_data_stripped = strip_flags.StripForEditor()
+    if not editor_data_stripped:
+        assert asset.summary.version_ue4 >= 242
+        highres_source_mesh_name, crc = (f.ReadFString(), f.ReadUInt32())
+
+    lighting_guid = f.ReadGuid()
+
+    socket_count = f.ReadInt32()# TArray<UStaticMeshSocket*> Sockets
+    assert socket_count == 0
+
+    v_obj = asset.summary.custom_versions.get(v_obj_guid, 0)
+    editor = not (asset.summary.package_flags & 0x8)
+
+    lod_bulks = [] # Per source model, None without a stored FRawMesh (reduced LODs). Payloads are at the end of the file, only the selected one is read
+    if not editor_data_stripped:
+        for src_model in self.properties['SourceModels'].value:
+            if v_obj < 28: # FEditorObjectVersion::StaticMeshDeprecatedRawMesh
+                lod_bulks.append(BulkHeader().Read(f, asset.summary).SkipInline(f))
+                guid, is_hash = (f.ReadGuid(), f.ReadBool32())
+            elif f.ReadBool32():
+                lod_bulks.append(BulkHeader().Read(f, asset.summary).SkipInline(f))
+
+                if v_obj >= 29: guid = f.ReadGuid() # FEditorObjectVersion::MeshDescriptionBulkDataGuid
+                v_enterprise_obj = asset.summary.custom_versions.get(v_ent_obj_guid, 0)
+                if v_enterprise_obj >= 8: is_hash = f.ReadBool32() # FEnterpriseObjectVersion::MeshDescriptionBulkDataGuidIsHash
+            else: lod_bulks.append(None)
+    tri_counts = [(RawMeshFaceCount(f, bulk) if lod == lod_lowest_poly else 0) if bulk and IsRawMeshDecodable(bulk) else None for bulk in lod_bulks]
+    i_lod = SelectLOD(tri_counts, lod)
+    raw = DecodeRawMesh(asset, f, lod_bulks[i_lod]) if i_lod is not None else None
+
+    assert not cooked
+
+    materials = None # Package indices, None falls back to the Materials property
+    ue4_v = asset.summary.compatible_version
+    ue4_14_or_above = ue4_v.major >= 4 and ue4_v.minor >= 14
+    if ue4_14_or_above:
+        speedtree_wind = f.ReadBool32()
+        assert not speedtree_wind
+
+        materials = []
+        if v_obj >= 8:
+            # TArray<FStaticMaterial> StaticMaterials
+            for i in range(f.ReadInt32()):
+                mat_interface, mat_slot_name = (f.ReadInt32(), f.ReadFName(asset.names))
+                if editor: imported_mat_slot_name = f.ReadFName(asset.names)
+                if v_obj >= 10:
+                    initialized, override_densities = (f.ReadBool32(), f.ReadBool32())
+                    local_uv_densities = (f.ReadFloat(), f.ReadFloat(), f.ReadFloat(), f.ReadFloat())
+                materials.append(mat_interface)
+
+    # remaining is SpeedTree
+
+    self.mesh_data = { 'raw':raw, 'materials':materials, 'lod_request':lod, 'lod_index':i_lod, 'lod_count':len(lod_bulks) }
+    return self.mesh_data
+def ReadFSkelMeshVertexBase(f:uasset.ByteStream, v_ren):
+    pos = f.ReadStructure(FVector)
+    if v_ren < 26: packed_normals = f.ReadStructure(FPackedNormal * 3) # IncreaseNormalPrecision
+    else: new_nx, new_ny, new_nz = (f.ReadStructure(FVector), f.ReadStructure(FVector), f.ReadStructure(FVector4))
+def ReadStaticLODModel4(asset:UAsset, f:uasset.ByteStream, decode=True): # FStaticLODModel4, decode=False seeks past the index & vertex buffers and only returns sections
+    v_obj = asset.summary.custom_versions.get(v_obj_guid, 0)
+    v_tangent = asset.summary.custom_versions.get(v_tang_guid, 0)
+    v_ren = asset.summary.custom_versions.get(v_ren_guid, 0)
+    v_skel = asset.summary.custom_versions.get(v_skel_guid, 0)
+
+    lod_strip_flags = ReadStripFlags(f, asset.summary)
+
+    has_cloth_data = False
+
+    # FSkelMeshSection4 sections
+    sections = []
+    for i_sect in range(f.ReadInt32()):
+        sect_strip_flags = ReadStripFlags(f, asset.summary)
+        strip_server = sect_strip_flags.StripForServer()
+        i_mat = f.ReadInt16()
+        if v_skel < 1: i_chunk = f.ReadInt16() # CombineSectionWithChunk
+        if not strip_server:
+            i_base, tri_count = (f.ReadInt32(), f.ReadInt32())
+            sections.append((i_mat, i_base, tri_count))
+        if v_skel < 13: tri_sorting = f.ReadUInt8() # RemoveTriangleSorting
+        if asset.summary.version_ue4 >= 254: # VER_UE4_APEX_CLOTH
+            if v_skel < 15: disabled = f.ReadBool32() # DeprecateSectionDisabledFlag
+            if v_skel < 14: cloth_section = f.ReadInt16() # RemoveDuplicatedClothingSections
+        if asset.summary.version_ue4 >= 280: enable_cloth_lod_depricated = f.ReadUInt8() # VER_UE4_APEX_CLOTH_LOD
+        if v_tangent >= 1: recompute_tangent = f.ReadBool32() # RuntimeRecomputeTangent
+        if v_tangent >= 2: recompute_tangent_vert_mask_channel = f.ReadUInt8() # RecomputeTangentVertexColorMask
+        if v_obj >= 8: cast_shadow = f.ReadBool32() # RefactorMeshEditorMaterials
+        if v_skel >= 1: # CombineSectionWithChunk
+            if not strip_server: i_base_vert = f.ReadUInt32()
+            if not sect_strip_flags.StripForEditor(): # TODO
+                if v_skel < 2: raise # CombineSoftAndRigidVerts
+                raise
+            raise
+
+    if v_skel < 12: indices = ReadFMultisizeIndexContainer(f, asset.summary, not decode) # SplitModelAndRenderData
+    elif decode: indices = ReadArrayNp(f, np.dtype(np.uint32))
+    else: f.SkipArray(c_uint32)
+
+    active_bone_indices = f.ReadArray(c_int16) # Bones with vertices
+
+    assert not (asset.summary.compatible_version.major >= 4 and asset.summary.compatible_version.minor >= 20), "Handle packed normals"
+
+    chunks = None
+    if v_skel < 1: # CombineSectionWithChunk
+        # TArray<FSkelMeshChunk4> Chunks
+        chunks = []
+        for i_chunk in range(f.ReadInt32()):
+            strip_flags = ReadStripFlags(f, asset.summary)
+            if not strip_flags.StripForServer(): base_vert_i = f.ReadInt32()
+            if not strip_flags.StripForEditor():
+                skel_influences = 8 if asset.summary.version_ue4 >= 332 else 4 # VER_UE4_SUPPORT_8_BONE_INFLUENCES_SKELETAL_MESHES
+                # FRigidVertex4 rigid_verts
+                for i in range(f.ReadInt32()):
+                    ReadFSkelMeshVertexBase(f, v_ren)
+                    uvs, color, i_bone = (f.ReadStructure(FVector2D * 4), f.ReadStructure(FColor), f.ReadUInt8())
+                # FSoftVertex4 soft_verts
+                for i in range(f.ReadInt32()):
+                    ReadFSkelMeshVertexBase(f, v_ren)
+                    uvs, color = (f.ReadStructure(FVector2D * 4), f.ReadStructure(FColor))
+                    assert skel_influences > 4 and skel_influences <= 8
+                    bone_indices = f.ReadStructure(c_ubyte * skel_influences)
+                    bone_weights = f.ReadStructure(c_ubyte * skel_influences)
+            bone_map, rigid_vert_c, soft_vert_c, max_bone_influences = (f.ReadArray(c_uint16), f.ReadInt32(), f.ReadInt32(), f.ReadInt32())
+            if asset.summary.version_ue4 >= 254: # VER_UE4_APEX_CLOTH
+                cloth_mappings, physical_mesh_verts, physical_mesh_norms = (f.ReadArray(FApexClothPhysToRenderVertData), f.ReadArray(FVector), f.ReadArray(FVector))
+                cloth_asset_i, cloth_submesh_i = (f.ReadInt16(), f.ReadInt16())
+                has_cloth_data |= len(cloth_mappings) > 0
+            chunks.append((rigid_vert_c, soft_vert_c, list(bone_map)))
+
+    lod_size = f.ReadInt32()
+    if not lod_strip_flags.StripForServer(): vert_c = f.ReadInt32()
+    required_bones = f.ReadArray(c_int16)
+    if not lod_strip_flags.StripForEditor():
+        bulk = BulkHeader().Read(f, asset.summary)
+        if not (bulk.flags & (0x1 | 0x100)): # BULKDATA_PayloadAtEndOfFile | BULKDATA_PayloadInSeperateFile
+            if bulk.flags & 0x40: f.Seek(bulk.byte_size, mode=io.SEEK_CUR) # BULKDATA_ForceInlinePayload
+    if asset.summary.version_ue4 >= 152: mesh_to_import_vert_map, max_import_vert_i = (f.ReadArray(c_int32), f.ReadInt32()) # VER_UE4_ADD_SKELMESH_MESHTOIMPORTVERTEXMAP
+
+    uv_c = skel_infl_c = 0
+    positions, normals, vert_uvs = (np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32), np.zeros((0, 0, 2), np.float32))
+    bone_indices, bone_weights = (np.zeros((0, 0), np.int32), np.zeros((0, 0), np.uint8))
+
+    if not lod_strip_flags.StripForServer(): # geometry TODO: var?
+        uv_c = f.ReadInt32()
+
+        if v_skel < 12: # SplitModelAndRenderData
+            # FSkeletalMeshVertexBuffer4 VertexBufferGPUSkin
+            vb_strip = ReadStripFlags(f, asset.summary, 269) # VER_UE4_STATIC_SKELETAL_MESH_SERIALIZATION_FIX
+            uv_c, float_uvs = (f.ReadInt32(), f.ReadBool32())
+            assert uv_c > 0 and uv_c < 32
+            if asset.summary.version_ue4 >= 334 and v_skel < 7: extra_bone_influences = f.ReadBool32() # VER_UE4_SUPPORT_GPUSKINNING_8_BONE_INFLUENCES & UseSeparateSkinWeightBuffer
+            else: extra_bone_influences = False
+            mesh_extension, mesh_origin = (f.ReadStructure(FVector), f.ReadStructure(FVector))
+            skel_infl_c = 8 if extra_bone_influences else 4
+
+            if v_skel < 7: assert skel_infl_c <= 4 # UseSeparateSkinWeightBuffer, FSkinWeightInfo inline
+            vert_dtype = GPUSkinVertexDtype(skel_infl_c, uv_c, float_uvs, v_skel < 7)
+            el_size = f.ReadInt32() # ReadBulkArray
+            assert el_size == vert_dtype.itemsize, f"GPU skin vertex is {el_size} bytes, expected {vert_dtype.itemsize}"
+            if decode:
+                verts = ReadArrayView(f, vert_dtype) # Every field is converted into its own array below
+                uprofile.Count('bulk_bytes', verts.nbytes, asset.filepath, 'SkeletalMesh')
+                positions, normals, vert_uvs = (ToBlenderPositions(verts['pos']), UnpackNormals(verts['tangent_z']), ToBlenderUVs(verts['uvs']))
+                if v_skel < 7 and chunks is not None: bone_indices, bone_weights = (MapChunkBones(verts['bone_indices'], chunks), verts['bone_weights'].copy())
+            else: f.Seek(el_size * f.ReadInt32(), mode=io.SEEK_CUR)
+
+            if v_skel >= 7: # UseSeparateSkinWeightBuffer
+                raise # FSkinWeightVertexBuffer SkinWeights
+            # TODO: LoadingMesh->bHasVertexColors?
+            if not lod_strip_flags.StripClassData(1): adj_indices = ReadFMultisizeIndexContainer(f, asset.summary, True) # CDSF_AdjacencyData
+            if asset.summary.version_ue4 >= 254 and has_cloth_data: raise # VER_UE4_APEX_CLOTH
+
+    if not decode: return { 'sections':sections }
+    return {
+        'sections':sections, 'indices':indices.astype(np.uint32), 'chunks':chunks, 'uv_count':uv_c, 'influences':skel_infl_c,
+        'positions':positions, 'normals':normals, 'uvs':vert_uvs, # Blender space, as DecodeRawMesh
+        'bone_indices':bone_indices, 'bone_weights':bone_weights # Reference skeleton bone & weight / 255 per influence
+    }
+@uprofile.Spanned("bulk")
+def DecodeSkeletalMesh(self:Export, lod=0):
+    asset = self.asset
+    f = asset.f
+    self.ReadProperties(False, False)
+
+    if f.ReadInt32(): self.guid = f.ReadGuid()
+
+    strip_flags = ReadStripFlags(f, asset.summary)
+    bounds = f.ReadStructure(uasset.FBoxSphereBounds)
+
+    v_obj = asset.summary.custom_versions.get(v_obj_guid, 0)
+    v_tangent = asset.summary.custom_versions.get(v_tang_guid, 0)
+    v_ren = asset.summary.custom_versions.get(v_ren_guid, 0)
+    v_skel = asset.summary.custom_versions.get(v_skel_guid, 0)
+
+    # TArray<FSkeletalMaterial> Materials;
+    materials = []
+    for i in range(f.ReadInt32()):
+        materials.append(f.ReadInt32())
+        assert v_obj < 8 # RefactorMeshEditorMaterials
+        if asset.summary.version_ue4 >= 302: shadow_casting = f.ReadBool32() # VER_UE4_MOVE_SKELETALMESH_SHADOWCASTING
+        if v_tangent >= 1: recompute_tangent = f.ReadBool32() # RuntimeRecomputeTangent
+        assert v_ren < 10 # TextureStreamingMeshUVChannelData
+
+    # FReferenceSkeleton
+    ref_bone_info = [] # TArray<FMeshBoneInfo>
+    for i in range(f.ReadInt32()):
+        name, i_parent = (f.ReadFName(asset.names), f.ReadInt32())
+        assert i_parent >= -1
+        if asset.summary.version_ue4 < 310: color = f.ReadStructure(FColor) # VER_UE4_REFERENCE_SKELETON_REFACTOR
+        if asset.summary.version_ue4 >= 370: export_name = f.ReadFString() # VER_UE4_STORE_BONE_EXPORT_NAMES
+        ref_bone_info.append((name, i_parent))
+
+    ref_bone_pose:list[uasset.FTransform] = f.ReadArray(uasset.FTransform) # TArray<FTransform>
+
+    index_to_name = {}
+    if asset.summary.version_ue4 >= 310: # VER_UE4_REFERENCE_SKELETON_REFACTOR
+        for i in range(f.ReadInt32()):
+            key, value = ( f.ReadFName(asset.names), f.ReadInt32() )
+            index_to_name[value] = key
+    else:
+        for i in range(len(ref_bone_info)): index_to_name[i] = ref_bone_info[i][0]
+
+    self.mesh_data = data = { 'materials':materials, 'bone_names':[index_to_name[i] for i in sorted(index_to_name)], 'lod':None }
+
+    if v_skel < 12: # SplitModelAndRenderData
+        # TArray<FStaticLODModel4> LODModels, stored inline so unselected LODs are skimmed for their layout, skipping the vertex buffers
+        c_lod, i_lod = (f.ReadInt32(), None)
+        if lod == lod_lowest_poly: # Triangle counts come from the sections, then back to the smallest
+            starts, tri_counts = ([], [])
+            for i in range(c_lod):
+                starts.append(f.Position())
+                sections = ReadStaticLODModel4(asset, f, False)['sections']
+                tri_counts.append(sum(tri_count for i_mat, i_base, tri_count in sections) if sections else None)
+            if (i_lod := SelectLOD(tri_counts, lod)) is not None: f.Seek(starts[i_lod])
+        elif c_lod > 0:
+            i_lod = min(lod, c_lod - 1)
+            for i in range(i_lod): ReadStaticLODModel4(asset, f, False)
+        if i_lod is not None: data['lod'] = ReadStaticLODModel4(asset, f) # Nothing after the selected LOD is read
+        data.update(lod_request=lod, lod_index=i_lod, lod_count=c_lod)
+        return data
+    else: raise # TODO
+def DecodeMesh(export:Export, lod=0):
+    match export.export_class_type:
+        case 'StaticMesh': return DecodeStaticMesh(export, lod)
+        case 'SkeletalMesh': return DecodeSkeletalMesh(export, lod)
+def GetMeshData(export:Export, lod=0): # Prefetched mesh_data when it was decoded for the same LOD
+    if (data := getattr(export, 'mesh_data', None)) and data.get('lod_request') == lod: return data
+    return DecodeMesh(export, lod)
+
+# FInstancedStaticMeshInstanceData by element size: FMatrix, FMatrix + lightmap & shadowmap UV bias (before FMobileObjectVersion::InstancedStaticMeshLightmapSerialization)
+instance_dtypes = { 64:np.dtype(('<f4', (4, 4))), 80:np.dtype([('transform', '<f4', (4, 4)), ('uv_bias', '<f4', 4)]) }
+def SkipStaticMeshComponentLODData(f:uasset.ByteStream, summary:uasset.USummary) -> bool: # UStaticMeshComponent::Serialize TArray<FStaticMeshComponentLODInfo>, False for inline lightmaps
+    v_ren = summary.custom_versions.get(v_ren_guid, 0)
+    for i in range(f.ReadInt32()):
+        strip_flags = ReadStripFlags(f, summary)
+        if not strip_flags.StripForServer():
+            if v_ren < 9: return False # MapBuildDataSeparatePackage, FLightMapRef & FShadowMapRef before
+            f.ReadGuid() # MapBuildDataId
+        if not strip_flags.StripClassData(1) and f.ReadUInt8(): # OverrideVertexColors, FColorVertexBuffer::Serialize
+            vertex_strip_flags = ReadStripFlags(f, summary, 242) # VER_UE4_STATIC_SKELETAL_MESH_SERIALIZATION_FIX
+            _, vert_count = (f.ReadInt32(), f.ReadInt32()) # Stride & NumVertices are written even when the data is stripped
+            if not vertex_strip_flags.StripForServer() and vert_count > 0:
+                el_size = f.ReadInt32() # BulkSerialize
+                f.Seek(el_size * f.ReadInt32(), mode=io.SEEK_CUR)
+        if not strip_flags.StripForEditor(): f.Seek((32 if v_ren >= 26 else 20) * f.ReadInt32(), mode=io.SEEK_CUR) # FPaintedVertex: FVector, FVector4 normal (FPackedNormal before IncreaseNormalPrecision), FColor
+    return True
+def DecodeInstances(self:Export) -> np.ndarray: # UInstancedStaticMeshComponent::Serialize PerInstanceSMData, (count, 4, 4) row vector matrices relative to the component
+    asset, f = (self.asset, self.asset.f)
+    self.ReadProperties(False)
+    if f.ReadInt32(): f.ReadGuid() # UObject::Serialize, FLazyObjectPtr guid
+    if not SkipStaticMeshComponentLODData(f, asset.summary):
+        print(f"Skipping instances of {self.object_name}, lightmaps stored before MapBuildDataSeparatePackage aren't supported")
+        return np.empty((0, 4, 4))
+    if asset.summary.custom_versions.get(v_fn_main_guid, 0) >= 11 or asset.summary.custom_versions.get(v_obj_guid, 0) >= 24: f.ReadBool32() # bCooked, F(FortniteMainBranch|Editor)ObjectVersion::SerializeInstancedStaticMeshRenderData
+    el_size, count = (f.ReadInt32(), f.ReadInt32()) # PerInstanceSMData.BulkSerialize
+    if el_size not in instance_dtypes or count < 0 or f.Position() + el_size * count > self.serial_desc.offset + self.serial_desc.count:
+        print(f"Skipping instances of {self.object_name}, unexpected PerInstanceSMData ({count} x {el_size} bytes)")
+        return np.empty((0, 4, 4))
+    instances = f.ReadRecords(instance_dtypes[el_size], count)
+    if instances.dtype.names: instances = instances['transform']
+    return instances.astype(np.float64)
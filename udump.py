@@ -0,0 +1,107 @@
+import os, sys, time, json, uuid, argparse, contextlib
+import numpy as np
+from ctypes import Structure, Array
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+
+import uasset, udecode
+from uasset import UAsset, Import, Export, UProperty, FExpressionInput, ArrayDesc, EngineVersion
+
+# Headless package inspector, no bpy: python -m udump [-p] [-t] [-m] <.uasset/.umap files or dirs>
+package_exts = ('.uasset', '.umap')
+
+def ToJson(value):
+    if value is None or isinstance(value, (bool, int, float, str)): return value
+    if isinstance(value, UProperty):
+        if (decoded := getattr(value, 'map', None)) is not None: return ToJson(decoded)
+        return ToJson(getattr(value, 'value', None))
+    if isinstance(value, dict): return { str(k):ToJson(v) for k, v in value.items() }
+    if isinstance(value, (list, tuple)): return [ToJson(v) for v in value]
+    if isinstance(value, Export): return { 'export':value.object_name, 'class':value.export_class_type }
+    if isinstance(value, Import): return { 'import':value.object_name, 'class':value.class_name }
+    if isinstance(value, FExpressionInput): return { 'node':ToJson(value.node), 'output':value.node_output_i, 'input_name':value.input_name }
+    if isinstance(value, Structure): return { name:ToJson(getattr(value, name)) for name, ty in value._fields_ }
+    if isinstance(value, Array): return [ToJson(v) for v in value]
+    if isinstance(value, (bytes, bytearray, memoryview)): return { 'bytes':len(value) }
+    if isinstance(value, np.ndarray): return { 'dtype':str(value.dtype), 'shape':value.shape }
+    if isinstance(value, np.generic): return value.item()
+    if isinstance(value, uuid.UUID): return str(value)
+    if isinstance(value, (ArrayDesc, EngineVersion)): return { k:ToJson(v) for k, v in vars(value).items() }
+    return repr(value)
+
+def DumpSummary(asset:UAsset):
+    s = asset.summary
+    return { 'version_ue4':s.version_ue4, 'version_ue4_licensee':s.version_ue4_licensee, 'compatible_version':ToJson(s.compatible_version), 'package_flags':s.package_flags,
+             'package_guid':str(s.package_guid), 'header_size':s.header_size, 'bulk_data_offset':s.bulk_data_offset, 'custom_versions':len(getattr(s, 'custom_versions', {})),
+             'names':s.names_desc.count, 'imports':s.imports_desc.count, 'exports':s.exports_desc.count }
+def DumpImport(imp:Import): return { 'object_name':imp.object_name, 'class_package':imp.class_package, 'class_name':imp.class_name, 'outer_index':int(imp.outer_index) }
+def DumpExport(export:Export):
+    return { 'object_name':export.object_name, 'class':export.export_class_type, 'outer_index':int(export.outer_index), 'serial_offset':int(export.serial_desc.offset),
+             'serial_size':int(export.serial_desc.count), 'is_asset':getattr(export, 'is_asset', None) }
+def DumpMesh(export:Export, lod=0):
+    udecode.DecodeMesh(export, lod)
+    return ToJson(getattr(export, 'mesh_data', None))
+
+def DumpPackage(filepath:str, tables=False, properties=False, meshes=False, decode_maps=False, lod=0):
+    t0 = time.perf_counter()
+    asset = UAsset(filepath)
+    asset.Read(False)
+    try:
+        out = { 'file':asset.filepath, 'main_export':(main_export.object_name if (main_export := asset.GetMainExport()) else None), 'summary':DumpSummary(asset) }
+        if tables:
+            out['names'] = list(asset.names)
+            out['imports'] = [DumpImport(imp) for imp in asset.imports]
+        if tables or properties or meshes:
+            exports = []
+            for export in asset.exports:
+                entry = DumpExport(export)
+                if properties:
+                    export.ReadProperties(False)
+                    if decode_maps and export.properties:
+                        for prop in export.properties.values():
+                            if prop.type == "MapProperty" and hasattr(prop, 'value_offset'): prop.DecodeMap(asset)
+                    entry['properties'] = ToJson(export.properties)
+                if meshes and export.export_class_type in ('StaticMesh', 'SkeletalMesh'): entry['mesh'] = DumpMesh(export, lod)
+                exports.append(entry)
+            out['exports'] = exports
+        out['seconds'] = round(time.perf_counter() - t0, 6)
+        return out
+    finally: asset.Close()
+
+def IterPackageFiles(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.endswith(package_exts): yield os.path.join(root, file)
+        else: yield path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="udump", description="Dump Unreal package summaries, tables & properties as JSON (one document per line)")
+    parser.add_argument('paths', nargs='+', help=".uasset/.umap files or directories to walk")
+    parser.add_argument('-t', '--tables', action='store_true', help="Include the name, import & export tables")
+    parser.add_argument('-p', '--properties', action='store_true', help="Read every export's properties")
+    parser.add_argument('-m', '--meshes', action='store_true', help="Decode static & skeletal mesh exports, array shapes only")
+    parser.add_argument('--maps', action='store_true', help="Decode MapProperty pairs, with --properties")
+    parser.add_argument('--lod', type=int, default=0, help=f"Mesh LOD to decode with --meshes, {udecode.lod_lowest_poly} for the lowest poly")
+    parser.add_argument('--indent', type=int, default=None, help="Pretty print with this indent")
+    parser.add_argument('--cache', action='store_true', help="Read & write the project's header cache (Export/HeaderCache), off so inspecting leaves the project untouched")
+    parser.add_argument('--quiet', action='store_true', help="Silence parser logging")
+    args = parser.parse_args(argv)
+
+    uasset.use_header_cache = args.cache
+    if args.quiet: uasset.logging = False
+    uasset.use_asset_cache = False
+    c_failed = 0
+    for filepath in IterPackageFiles(args.paths):
+        try:
+            with contextlib.redirect_stdout(sys.stderr): out = DumpPackage(filepath, args.tables, args.properties, args.meshes, args.maps, args.lod) # Keep stdout pure JSON
+        except Exception as e:
+            out = { 'file':filepath, 'error':f"{type(e).__name__}: {e}" }
+            c_failed += 1
+        print(json.dumps(out, indent=args.indent))
+    return 1 if c_failed else 0
+
+if __name__ == "__main__": sys.exit(main())
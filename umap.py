@@ -1,4 +1,5 @@
 import bpy, os, sys, math, importlib, time, zlib
+import numpy as np
 from dataclasses import dataclass
 from mathutils import *
 from bpy.props import *
@@ -7,13 +8,19 @@ from bpy_extras.io_utils import ImportHelper
 cur_dir = os.path.dirname(__file__)
 if cur_dir not in sys.path: sys.path.append(cur_dir)
 
-import uasset, umat, umesh, register_helper
+import uasset, udecode, umat, umesh, uregistry, uprefetch, uprofile, register_helper
 from uasset import UAsset, Import, Export, FVector, FColor
 from umat import TryGetUMaterialImport
 from umesh import ImportMeshUAsset
 
 hide_noncasting = False
 deg2rad = math.radians(1)
+instance_min_count = 2 # Smaller mesh groups stay plain objects
+instancer_group_name = "UMap Instancer"
+slice_ms = 16 # Per timer tick of a background import
+batch_assembly = True # Queue object links, parents & transforms during the export loop and apply them together (SceneAssembly)
+assembly = None # SceneAssembly while LoadUMap runs
+collection = None # The map's root collection while LoadUMap runs, captured once by UMapImportJob instead of asking bpy.context every slice
 
 @dataclass
 class UMapImportSettings():
@@ -29,24 +36,32 @@ class UMapImportSettings():
     force_shadows:    bool  = False
     light_intensity:  float = 1
     light_angle_coef: float = 1
+    registry:         bool  = False
+    prefetch:         bool  = True
+    lod:              int   = 0 # Or udecode.lod_lowest_poly
+    instance_meshes:  bool  = False
 
 def SetupObjectFull(cfg:UMapImportSettings, export:Export, data=None, name=None):
-    parent_coll = bpy.context.collection
+    parent_coll = collection
     if cfg.folders and (folder_path := export.properties.TryGetValue('FolderPath')):
-        for folder in folder_path.split('/'):
-            if (coll := bpy.data.collections.get(folder)) == None:
-                coll = bpy.data.collections.new(folder)
-                parent_coll.children.link(coll)
-            parent_coll = coll
+        if assembly: parent_coll = assembly.Folder(folder_path)
+        else:
+            for folder in folder_path.split('/'):
+                if (coll := bpy.data.collections.get(folder)) == None:
+                    coll = bpy.data.collections.new(folder)
+                    parent_coll.children.link(coll)
+                parent_coll = coll
 
     return SetupObject(name if name else export.properties.TryGetValue('ActorLabel', export.object_name), data, parent_coll)
 def SetupObject(name, data, collection):
     obj = bpy.data.objects.new(name, data)
     obj.rotation_mode = 'YXZ'
     obj.empty_display_type = 'ARROWS'
-    collection.objects.link(obj)
+    if assembly: assembly.Link(obj, collection)
+    else: collection.objects.link(obj)
     return obj
-def Transform(export:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scale=1):
+def ObjectCollection(obj): return assembly.CollectionOf(obj) if assembly else obj.users_collection[0]
+def Transform(export:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scale=1, post_pitch=0):
     props = export.properties
 
     # Unreal: X+ Forward, Y+ Right, Z+ Up     Blender: X+ Right, Y+ Forward, Z+ Up
@@ -60,29 +75,37 @@ def Transform(export:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scal
 
     rel_scale = props.TryGetValue('RelativeScale3D', def_scale)
     obj.scale = Vector((rel_scale.y,rel_scale.x,rel_scale.z)) * scale
+    if post_pitch: obj.rotation_euler.rotate_axis('X', post_pitch*deg2rad)
 def Parent(export:Export, obj):
     if attach := export.properties.TryGetValue('AttachParent'): # TODO: unify?
+        if not hasattr(attach, 'bl_obj') and (realize := getattr(attach, 'realize', None)): realize()
         assert hasattr(attach, 'bl_obj')
         obj.parent = attach.bl_obj
         parent_coll = obj.parent.users_collection[0]
         if parent_coll != obj.users_collection[0]: parent_coll.objects.link(obj)
-def TryApplyRootComponent(export:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scale=1):
+def ApplyComponent(comp:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scale=1, post_pitch=0, template:Export=None): # template: where the transform comes from when not comp itself
+    if assembly: assembly.Place(obj, comp, pitch_offset, def_scale, scale, post_pitch, template)
+    else:
+        Parent(comp, obj)
+        Transform(template or comp, obj, pitch_offset, def_scale, scale, post_pitch)
+    comp.bl_obj = obj
+def TryApplyRootComponent(export:Export, obj, pitch_offset=0, def_scale=FVector(1,1,1), scale=1, post_pitch=0):
     if root_export := export.properties.TryGetValue('RootComponent'):
         root_export.ReadProperties(False)
-        Parent(root_export, obj)
-        Transform(root_export, obj, pitch_offset, def_scale, scale)
-        root_export.bl_obj = obj
+        ApplyComponent(root_export, obj, pitch_offset, def_scale, scale, post_pitch)
         return True
     return False
-def TryGetMesh(static_mesh_comp:Export, m_type, import_materials=True):
+def TryGetMesh(static_mesh_comp:Export, m_type, import_materials=True, lod=0):
     mesh = None
     if mesh_prop := static_mesh_comp.properties.TryGetValue(m_type):
         mesh_name = mesh_prop.object_name
         mesh = bpy.data.meshes.get(mesh_name)
-        if not mesh or not mesh.get('UAsset'):
-            if mesh_import := mesh_prop.import_ref:
+        if not mesh or not mesh.get('UAsset') or mesh.get('UAssetLOD', 0) != lod:
+            if (mesh_import := mesh_prop.import_ref) and not uregistry.IsA(static_mesh_comp.asset.uproject, mesh_import.object_name, ('StaticMesh','SkeletalMesh')):
+                print(f"Skipping \"{mesh_import.object_name}\", Registry has no Mesh Package")
+            elif mesh_import:
                 mesh_path = static_mesh_comp.asset.ToProjectPath(mesh_import.object_name)
-                mesh = ImportMeshUAsset(mesh_path, static_mesh_comp.asset.uproject, import_materials)
+                mesh = ImportMeshUAsset(mesh_path, static_mesh_comp.asset.uproject, import_materials, lod=lod)
                 if not mesh: print(f"Failed to get Mesh \"{mesh_path}\"")
         if import_materials:
             mat_overrides:list[Import] = static_mesh_comp.properties.TryGetValue('OverrideMaterials')
@@ -100,7 +123,264 @@ def TryGetMesh(static_mesh_comp:Export, m_type, import_materials=True):
                         for i in range(c_override):
                             if mat_override := mat_overrides[i].value: mesh.materials[i] = TryGetUMaterialImport(mat_override, mesh)
     return mesh
-def ProcessUMapExport(export:Export, cfg:UMapImportSettings):
+def EulerYXZToMatrix(eul:np.ndarray) -> np.ndarray: # Per row, Transform's rotation_mode, Rz @ Rx @ Ry
+    sx, sy, sz = np.sin(eul).T
+    cx, cy, cz = np.cos(eul).T
+    return np.stack((cz * cy - sz * sx * sy, -sz * cx, cz * sy + sz * sx * cy, sz * cy + cz * sx * sy, cz * cx, sz * sy - cz * sx * cy, -cx * sy, sx, cx * cy), 1).reshape(-1, 3, 3)
+def PitchMatrix(angles:np.ndarray) -> np.ndarray: return EulerYXZToMatrix(np.stack((angles, np.zeros_like(angles), np.zeros_like(angles)), 1))
+def MatrixToEulerYXZ(rot:np.ndarray) -> np.ndarray: # Of the two solutions the one with the smaller sum of angles, as mathutils picks it (mat3_normalized_to_eulO)
+    cos_x = np.hypot(rot[:, 1, 1], rot[:, 0, 1])
+    gimbal = cos_x <= 16 * np.finfo(np.float32).eps
+    eul1 = -np.stack((np.arctan2(-rot[:, 2, 1], cos_x), np.where(gimbal, np.arctan2(-rot[:, 0, 2], rot[:, 0, 0]), np.arctan2(rot[:, 2, 0], rot[:, 2, 2])), np.where(gimbal, 0, np.arctan2(rot[:, 0, 1], rot[:, 1, 1]))), 1)
+    eul2 = np.where(gimbal[:, None], eul1, -np.stack((np.arctan2(-rot[:, 2, 1], -cos_x), np.arctan2(-rot[:, 2, 0], -rot[:, 2, 2]), np.arctan2(-rot[:, 0, 1], -rot[:, 1, 1])), 1))
+    return np.where((np.abs(eul1).sum(1) > np.abs(eul2).sum(1))[:, None], eul2, eul1)
+def MatrixToEulerXYZ(rot:np.ndarray) -> np.ndarray: # What Instance on Points takes
+    cos_y = np.hypot(rot[:, 0, 0], rot[:, 1, 0])
+    gimbal = cos_y < 1e-6
+    xyz = np.empty((len(rot), 3))
+    xyz[:, 0] = np.where(gimbal, np.arctan2(-rot[:, 1, 2], rot[:, 1, 1]), np.arctan2(rot[:, 2, 1], rot[:, 2, 2]))
+    xyz[:, 1] = np.arctan2(-rot[:, 2, 0], cos_y)
+    xyz[:, 2] = np.where(gimbal, 0, np.arctan2(rot[:, 1, 0], rot[:, 0, 0]))
+    return xyz
+def InstanceMatricesToPoints(mats:np.ndarray): # UE row vector matrices -> Blender locations, XYZ eulers & scales, the same axis swap as Transform
+    swap = [1, 0, 2]
+    basis = mats[:, :3, :3].transpose(0, 2, 1)[:, swap][:, :, swap]
+    scales = np.linalg.norm(basis, axis=1)
+    scales[np.linalg.det(basis) < 0, 0] *= -1 # Mirrored, one negative axis is enough
+    return mats[:, 3, swap] * 0.01, MatrixToEulerXYZ(basis / np.where(scales == 0, 1, scales)[:, None, :]), scales
+def GetInstancerNodeGroup():
+    if node_group := bpy.data.node_groups.get(instancer_group_name): return node_group
+    node_group = bpy.data.node_groups.new(instancer_group_name, 'GeometryNodeTree')
+    if hasattr(node_group, 'interface'): # 4.0+
+        node_group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+        node_group.interface.new_socket("Instance", in_out='INPUT', socket_type='NodeSocketObject')
+        node_group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+    else:
+        node_group.inputs.new('NodeSocketGeometry', "Geometry")
+        node_group.inputs.new('NodeSocketObject', "Instance")
+        node_group.outputs.new('NodeSocketGeometry', "Geometry")
+    nodes, links = (node_group.nodes, node_group.links)
+    group_in, group_out, obj_info, on_points = (nodes.new('NodeGroupInput'), nodes.new('NodeGroupOutput'), nodes.new('GeometryNodeObjectInfo'), nodes.new('GeometryNodeInstanceOnPoints'))
+    obj_info.transform_space = 'ORIGINAL'
+    obj_info.inputs['As Instance'].default_value = True
+    links.new(group_in.outputs['Geometry'], on_points.inputs['Points'])
+    links.new(group_in.outputs['Instance'], obj_info.inputs['Object'])
+    links.new(obj_info.outputs['Geometry'], on_points.inputs['Instance'])
+    for attr_name, socket in (("rotation", 'Rotation'), ("scale", 'Scale')):
+        attr = nodes.new('GeometryNodeInputNamedAttribute')
+        attr.data_type = 'FLOAT_VECTOR'
+        attr.inputs['Name'].default_value = attr_name
+        links.new(next(output for output in attr.outputs if output.enabled), on_points.inputs[socket])
+    links.new(on_points.outputs['Instances'], group_out.inputs['Geometry'])
+    for i, node in enumerate((group_in, obj_info, on_points, group_out)): node.location = (200 * i, 0)
+    return node_group
+def NodeGroupInputId(node_group, name:str) -> str: return node_group.interface.items_tree[name].identifier if hasattr(node_group, 'interface') else node_group.inputs[name].identifier
+class MeshInstancer: # Geometry nodes point clouds, one per mesh (material overrides included, see TryGetMesh): root level StaticMeshActors sharing it & instanced mesh components
+    def __init__(self, cfg:UMapImportSettings, collection):
+        self.cfg = cfg
+        self.collection = collection
+        self.groups:dict[str,tuple] = {} # mesh name -> (mesh, [StaticMeshActor exports])
+        self.components:list[Export] = []
+        self.hidden:dict[str,object] = {} # name suffix -> collection excluded from the view layer
+        self.prefabs:dict[tuple,object] = {} # (blueprint path, component names) -> collection
+    def TryAdd(self, export:Export, mesh) -> bool:
+        if not (root_export := export.properties.TryGetValue('RootComponent')): return False
+        root_export.ReadProperties(False)
+        if root_export.properties.TryGetValue('AttachParent'): return False # World transform depends on its parent
+        root_export.realize = lambda: self.Realize(root_export, export, mesh)
+        self.groups.setdefault(mesh.name, (mesh, []))[1].append(export)
+        return True
+    def AddComponent(self, export:Export): self.components.append(export) # Built last, once the actors it can be attached to exist
+    def Realize(self, root_export:Export, export:Export, mesh): # Attach parent of a later actor, needs an object after all
+        del root_export.realize
+        self.groups[mesh.name][1].remove(export)
+        TryApplyRootComponent(export, SetupObjectFull(self.cfg, export, mesh))
+    def RealizeComponent(self, comp:Export, bp_obj, bp_asset:UAsset): # Same for a component inside a placed blueprint, an empty at its template's transform
+        del comp.realize
+        if gend_exp := bp_asset.name2exp.get(f"{comp.object_name}_GEN_VARIABLE"): gend_exp.ReadProperties()
+        ApplyComponent(comp, SetupObject(comp.object_name, None, ObjectCollection(bp_obj)), template=gend_exp or comp)
+    def HiddenCollection(self, suffix:str): # Instanced data, kept out of the view layer
+        if not (coll := self.hidden.get(suffix)):
+            self.hidden[suffix] = coll = bpy.data.collections.new(f"{self.collection.name} {suffix}")
+            self.collection.children.link(coll)
+            Exclude(coll)
+        return coll
+    def AttachTargets(self) -> set[int]: # ids of the components queued placements & instanced components attach to, up their parent chains
+        targets, comps = (set(), [placement[1] for placement in assembly.placements] if assembly else [])
+        comps += self.components
+        while comps:
+            comp = comps.pop()
+            comp.ReadProperties(False)
+            if (attach := comp.properties.TryGetValue('AttachParent')) and id(attach) not in targets:
+                targets.add(id(attach))
+                comps.append(attach)
+        return targets
+    @uprofile.Spanned("umap")
+    def Build(self):
+        targets = self.AttachTargets() # Actors something attaches to get objects, before their points are baked into a cloud
+        for mesh, exports in self.groups.values():
+            for root in [root for export in exports if id(root := export.properties.TryGetValue('RootComponent')) in targets and hasattr(root, 'realize')]: root.realize()
+        for mesh, exports in self.groups.values():
+            if len(exports) < instance_min_count:
+                for export in exports: TryApplyRootComponent(export, SetupObjectFull(self.cfg, export, mesh))
+            else: self.BuildGroup(mesh, exports)
+        for export in self.components: self.BuildComponent(export)
+    def GetSource(self, mesh):
+        sources = self.HiddenCollection("Instance Sources")
+        if not (source := sources.objects.get(mesh.name)):
+            source = bpy.data.objects.new(mesh.name, mesh)
+            sources.objects.link(source)
+        return source
+    def GetPrefab(self, bp_path:str, bp_asset:UAsset, comps:list[Export]): # Component tree of a placed blueprint, built once relative to its root from the *_GEN_VARIABLE templates
+        key = (bp_path, tuple(comp.object_name for comp in comps))
+        if prefab := self.prefabs.get(key): return prefab
+        self.prefabs[key] = prefab = bpy.data.collections.new(os.path.basename(bp_path))
+        self.HiddenCollection("Blueprints").children.link(prefab)
+        objs = {}
+        def PrefabObject(comp:Export):
+            if obj := objs.get(comp.object_name): return obj
+            if gend_exp := bp_asset.name2exp.get(f"{comp.object_name}_GEN_VARIABLE"): gend_exp.ReadProperties()
+            mesh = TryGetMesh(gend_exp, 'StaticMesh', self.cfg.materials, self.cfg.lod) if gend_exp and comp.export_class_type == 'StaticMeshComponent' and self.cfg.meshes else None
+            objs[comp.object_name] = obj = SetupObject(comp.object_name, mesh, prefab)
+            if attach := comp.properties.TryGetValue('AttachParent'): # The root's own transform is the placed actor's
+                obj.parent = PrefabObject(attach)
+                if gend_exp: Transform(gend_exp, obj)
+            return obj
+        for comp in comps:
+            if comp.export_class_type == 'StaticMeshComponent': PrefabObject(comp) # TODO: other components
+        return prefab
+    def Place(self, bp_obj, prefab, bp_asset:UAsset, comps:list[Export]): # Placed blueprint as one collection instance, its components only get objects when something attaches to them
+        bp_obj.instance_type, bp_obj.instance_collection = ('COLLECTION', prefab)
+        for comp in comps:
+            if not hasattr(comp, 'bl_obj'): comp.realize = lambda comp=comp: self.RealizeComponent(comp, bp_obj, bp_asset)
+    def BuildCloud(self, mesh, locs:np.ndarray, rotations:np.ndarray, scales:np.ndarray, int_attrs=()):
+        c = len(locs)
+        cloud = bpy.data.meshes.new(f"{mesh.name}_Points")
+        cloud.vertices.add(c)
+        cloud.vertices.foreach_set('co', locs.astype(np.float32).ravel())
+        for attr_name, attr_type, key, values in (("rotation", 'FLOAT_VECTOR', 'vector', rotations.astype(np.float32)), ("scale", 'FLOAT_VECTOR', 'vector', scales.astype(np.float32)),
+                                                  *((name, 'INT', 'value', values) for name, values in int_attrs)):
+            cloud.attributes.new(attr_name, attr_type, 'POINT').data.foreach_set(key, values.ravel())
+        cloud.update()
+        obj = SetupObject(f"{mesh.name} Instances", cloud, self.collection)
+        modifier = obj.modifiers.new("Instances", 'NODES')
+        modifier.node_group = node_group = GetInstancerNodeGroup()
+        modifier[NodeGroupInputId(node_group, "Instance")] = self.GetSource(mesh)
+        return obj
+    def BuildGroup(self, mesh, exports:list[Export]):
+        c = len(exports)
+        locs, rots, scales = (np.zeros((c, 3)), np.zeros((c, 3)), np.ones((c, 3)))
+        names, folders, folder_ids, i_folders = ([], [], {}, np.zeros(c, np.int32))
+        for i, export in enumerate(exports):
+            props = export.properties.TryGetValue('RootComponent').properties
+            if rel_loc := props.TryGetValue('RelativeLocation'): locs[i] = (rel_loc.x, rel_loc.y, rel_loc.z)
+            if rel_rot := props.TryGetValue('RelativeRotation'): rots[i] = (rel_rot.x, rel_rot.y, rel_rot.z)
+            if rel_scale := props.TryGetValue('RelativeScale3D'): scales[i] = (rel_scale.x, rel_scale.y, rel_scale.z)
+            names.append(export.properties.TryGetValue('ActorLabel', export.object_name))
+            folder = export.properties.TryGetValue('FolderPath', "") if self.cfg.folders else ""
+            if (i_folder := folder_ids.get(folder)) is None:
+                folder_ids[folder] = i_folder = len(folders)
+                folders.append(folder)
+            i_folders[i] = i_folder
+        # Same conversions as Transform: X/Y swapped, cm -> m, (Pitch, Yaw, Roll) -> YXZ (Pitch, Roll, -Yaw)
+        rotations = MatrixToEulerXYZ(EulerYXZToMatrix(np.stack((rots[:, 0], rots[:, 2], -rots[:, 1]), 1) * deg2rad))
+        obj = self.BuildCloud(mesh, locs[:, (1, 0, 2)] * 0.01, rotations, scales[:, (1, 0, 2)], (("actor", np.arange(c, dtype=np.int32)), ("folder", i_folders)))
+        obj["UActors"], obj["UFolders"] = (names, folders) # Indexed by the actor & folder point attributes
+    def BuildComponent(self, export:Export): # (Hierarchical) InstancedStaticMeshComponent, foliage included, instances relative to the component
+        with uprofile.Span("DecodeInstances", export.export_class_type): mats = udecode.DecodeInstances(export)
+        if not len(mats) or not (mesh := TryGetMesh(export, 'StaticMesh', self.cfg.materials, self.cfg.lod)): return
+        obj = self.BuildCloud(mesh, *InstanceMatricesToPoints(mats))
+        obj["UComponent"] = export.object_name
+        if attach := export.properties.TryGetValue('AttachParent'): self.EnsureAttachObject(attach)
+        ApplyComponent(export, obj)
+    def EnsureAttachObject(self, comp:Export): # Scene components of actors nothing else builds (foliage, unhandled classes) stand in as empties
+        if hasattr(comp, 'bl_obj') or hasattr(comp, 'realize'): return
+        comp.ReadProperties(False)
+        if attach := comp.properties.TryGetValue('AttachParent'): self.EnsureAttachObject(attach)
+        if type(owner := comp.asset.DecodePackageIndex(comp.outer_index)) is Export:
+            owner.ReadProperties(False)
+            obj = SetupObjectFull(self.cfg, owner, None, None if owner.properties.TryGetValue('RootComponent') is comp else comp.object_name)
+        else: obj = SetupObject(comp.object_name, None, self.collection)
+        ApplyComponent(comp, obj)
+def FindLayerCollection(layer_coll, collection):
+    if layer_coll.collection == collection: return layer_coll
+    for child in layer_coll.children:
+        if found := FindLayerCollection(child, collection): return found
+    return None
+def Exclude(collection):
+    if layer_coll := FindLayerCollection(bpy.context.view_layer.layer_collection, collection): layer_coll.exclude = True
+    if assembly: assembly.excluded.append(collection) # Again once the root is relinked
+class SceneAssembly: # Phase one (the export loop) creates objects & folders and queues links & placements, Finish() resolves parents, computes every transform in NumPy and links per collection
+    def __init__(self, root, detach:bool):
+        self.root = root
+        self.detach = detach # root is ours, unlinked from the scene while objects are linked into it
+        self.folders:dict[str,object] = { "":root } # FolderPath -> collection
+        self.links:list[tuple] = [] # (obj, collection)
+        self.first:dict[object,object] = {} # obj -> first collection, what users_collection[0] will be
+        self.placements:list[tuple] = [] # (obj, component, pitch_offset, def_scale, scale, post_pitch, template)
+        self.excluded = []
+    def Folder(self, path:str): # By full path, equally named folders elsewhere in the tree stay apart
+        if (coll := self.folders.get(path)) is None:
+            parent_path, _, folder = path.rpartition('/')
+            parent = self.Folder(parent_path)
+            self.folders[path] = coll = bpy.data.collections.new(folder)
+            parent.children.link(coll)
+        return coll
+    def Link(self, obj, collection):
+        self.links.append((obj, collection))
+        self.first.setdefault(obj, collection)
+    def CollectionOf(self, obj): return self.first.get(obj) or obj.users_collection[0]
+    def Place(self, obj, comp:Export, pitch_offset=0, def_scale=FVector(1,1,1), scale=1, post_pitch=0, template:Export=None): self.placements.append((obj, comp, pitch_offset, def_scale, scale, post_pitch, template))
+    @uprofile.Spanned("umap")
+    def Finish(self):
+        # Parents, realizing instanced ones something attaches to, which queues more placements
+        parents, i = ([], 0)
+        while i < len(self.placements):
+            obj, comp = self.placements[i][:2]
+            if attach := comp.properties.TryGetValue('AttachParent'):
+                if not hasattr(attach, 'bl_obj') and (realize := getattr(attach, 'realize', None)): realize()
+                if hasattr(attach, 'bl_obj'): parents.append((obj, attach.bl_obj))
+                else: print(f"Missing attach parent \"{attach.object_name}\" of \"{comp.object_name}\"")
+            i += 1
+
+        c = len(self.placements)
+        locs, rots, scales, pitches = (np.full((c, 3), np.nan), np.full((c, 3), np.nan), np.empty((c, 3)), np.empty((c, 2)))
+        for i, (obj, comp, pitch_offset, def_scale, scale, post_pitch, template) in enumerate(self.placements):
+            props = (template or comp).properties
+            if rel_loc := props.TryGetValue('RelativeLocation'): locs[i] = (rel_loc.x, rel_loc.y, rel_loc.z)
+            if rel_rot := props.TryGetValue('RelativeRotation'): rots[i] = (rel_rot.x, rel_rot.y, rel_rot.z)
+            rel_scale = props.TryGetValue('RelativeScale3D', def_scale)
+            scales[i] = (rel_scale.x * scale, rel_scale.y * scale, rel_scale.z * scale)
+            pitches[i] = (pitch_offset, post_pitch)
+        # As Transform: X/Y swapped, cm -> m, (Pitch, Yaw, Roll) -> YXZ (Pitch, Roll, -Yaw) rotated by the local pitch offsets
+        has_loc, has_rot = (~np.isnan(locs[:, 0]), ~np.isnan(rots[:, 0]))
+        set_rot = has_rot | (pitches[:, 1] != 0)
+        mats = np.tile(np.eye(3), (c, 1, 1))
+        mats[has_rot] = EulerYXZToMatrix(np.stack((rots[has_rot, 0], rots[has_rot, 2], -rots[has_rot, 1]), 1) * deg2rad) @ PitchMatrix(pitches[has_rot, 0] * deg2rad)
+        eulers = MatrixToEulerYXZ(mats @ PitchMatrix(pitches[:, 1] * deg2rad))
+        for (obj, *_), loc, euler, scale, is_loc, is_rot in zip(self.placements, (locs[:, (1, 0, 2)] * 0.01).tolist(), eulers.tolist(), scales[:, (1, 0, 2)].tolist(), has_loc.tolist(), set_rot.tolist()):
+            if is_loc: obj.location = loc
+            if is_rot: obj.rotation_euler = euler
+            obj.scale = scale
+        for obj, parent in parents:
+            obj.parent = parent
+            if (parent_coll := self.CollectionOf(parent)) != self.CollectionOf(obj): self.Link(obj, parent_coll)
+
+        scene_coll = bpy.context.scene.collection
+        detach = self.detach and scene_coll.children.get(self.root.name) == self.root
+        if detach: scene_coll.children.unlink(self.root) # Links into collections outside the scene skip the view layer resync
+        by_coll = {}
+        for obj, coll in self.links: by_coll.setdefault(coll, []).append(obj)
+        for coll, objs in by_coll.items():
+            with uprofile.Span("Link", "umap", count=len(objs)):
+                link = coll.objects.link
+                for obj in objs: link(obj)
+        if detach:
+            scene_coll.children.link(self.root)
+            bpy.context.view_layer.active_layer_collection = FindLayerCollection(bpy.context.view_layer.layer_collection, self.root)
+            for coll in self.excluded:
+                if layer_coll := FindLayerCollection(bpy.context.view_layer.layer_collection, coll): layer_coll.exclude = True
+def ProcessUMapExport(export:Export, cfg:UMapImportSettings, instancer:MeshInstancer):
     if type(export.export_class) is not uasset.Import: return
     match export.export_class.class_name:
         case 'Class':
@@ -108,13 +388,14 @@ def ProcessUMapExport(export:Export, cfg:UMapImportSettings):
                 case 'StaticMeshActor':
                     export.ReadProperties(True)
                     mesh_comp = export.properties.TryGetValue('StaticMeshComponent') if cfg.meshes else None
-                    mesh = TryGetMesh(mesh_comp, 'StaticMesh', cfg.materials) if mesh_comp else None
+                    mesh = TryGetMesh(mesh_comp, 'StaticMesh', cfg.materials, cfg.lod) if mesh_comp else None
+                    if cfg.instance_meshes and mesh and instancer.TryAdd(export, mesh): return # Built after the last export
                     obj = SetupObjectFull(cfg, export, mesh)
                     TryApplyRootComponent(export, obj)
                 case 'SkeletalMeshActor':
                     export.ReadProperties(True)
                     mesh_comp = export.properties.TryGetValue('SkeletalMeshComponent') if cfg.meshes else None
-                    mesh = TryGetMesh(mesh_comp, 'SkeletalMesh', cfg.materials) if mesh_comp else None
+                    mesh = TryGetMesh(mesh_comp, 'SkeletalMesh', cfg.materials, cfg.lod) if mesh_comp else None
                     obj = bpy.data.objects[mesh.name]
                     #obj = SetupObject(export.object_name, mesh) # TODO
                     TryApplyRootComponent(export, obj)
@@ -138,9 +419,7 @@ def ProcessUMapExport(export:Export, cfg:UMapImportSettings):
 
                     light = bpy.data.lights.new(export.object_name, light_type)
                     obj = SetupObjectFull(cfg, export, light)
-                    TryApplyRootComponent(export, obj, rot_off) # Blender lights are cursed, local Z- Forward, Y+ Up, X+ Right
-                    
-                    if export.export_class_type == 'DirectionalLight': obj.rotation_euler.rotate_axis('X', math.radians(90))
+                    TryApplyRootComponent(export, obj, rot_off, post_pitch=90 if export.export_class_type == 'DirectionalLight' else 0) # Blender lights are cursed, local Z- Forward, Y+ Up, X+ Right
                     
                     if light_comp := export.properties.TryGetValue('LightComponent'): # Export
                         light_props = light_comp.properties
@@ -198,6 +477,10 @@ def ProcessUMapExport(export:Export, cfg:UMapImportSettings):
 
                         obj = SetupObjectFull(cfg, export, cam)
                         TryApplyRootComponent(export, obj, 90)
+                case 'InstancedStaticMeshComponent' | 'HierarchicalInstancedStaticMeshComponent' | 'FoliageInstancedStaticMeshComponent':
+                    if cfg.meshes:
+                        export.ReadProperties(False)
+                        instancer.AddComponent(export)
                 case 'Actor':
                     export.ReadProperties(False)
                     obj = SetupObjectFull(cfg, export)
@@ -210,54 +493,122 @@ def ProcessUMapExport(export:Export, cfg:UMapImportSettings):
             TryApplyRootComponent(export, bp_obj)
 
             if bp_comps := export.properties.TryGetValue('BlueprintCreatedComponents'):
-                if not hasattr(export.asset, 'import_cache'): export.asset.import_cache = {}
-
                 bp_path = export.export_class.import_ref.object_name
                 if bp_path.startswith("/Engine/"): return
-                if not (bp_asset := export.asset.import_cache.get(bp_path)):
-                    bp_asset = UAsset(export.asset.ToProjectPath(bp_path), False, export.asset.uproject)
-                    bp_asset = bp_asset.__enter__()
+                if not uregistry.IsA(export.asset.uproject, bp_path, ('Blueprint',)): return
+                with UAsset(export.asset.ToProjectPath(bp_path), False, export.asset.uproject, lazy=True) as bp_asset: # Parsed once per session (uasset_cache)
                     bp_asset.EnsureIndexExports()
-                    export.asset.import_cache[bp_path] = bp_asset
-                
-                for comp in bp_comps:
-                    child_export = comp.value
-                    #ProcessUMapExport(child_export) # TODO? Can't, need to partly process gend_exp & child_export
-                    if child_export.export_class_type == 'StaticMeshComponent': # TODO: other components
-                        gend_exp = bp_asset.name2exp.get(f"{child_export.object_name}_GEN_VARIABLE")
-                        if gend_exp:
-                            gend_exp.ReadProperties()
-
-                            mesh = TryGetMesh(gend_exp, 'StaticMesh', cfg.materials) if cfg.meshes else None
-                            child_export.bl_obj = obj = SetupObjectFull(cfg, child_export, mesh)
-
-                            Parent(child_export, obj)
-                            Transform(gend_exp, obj)
+                    comps = [comp.value for comp in bp_comps if comp.value]
+                    instancer.Place(bp_obj, instancer.GetPrefab(bp_path, bp_asset, comps), bp_asset, comps)
+class UMapImportJob: # LoadUMap in steps: Step() runs a time budgeted slice of prefetching or exports, Finish() assembles what was processed & reports, also after Cancel()
+    def __init__(self, filepath, cfg=UMapImportSettings()):
+        self.t0 = time.time()
+        self.filepath, self.cfg = (filepath, cfg)
+        self.counts = (len(bpy.data.objects), len(bpy.data.meshes), len(bpy.data.materials), len(bpy.data.lights))
+        self.cancelled = False
+
+        self.asset_ref = UAsset(filepath, lazy=True)
+        self.asset = asset = self.asset_ref.__enter__() # Left in Release()
+        self.plan = self.prefetching = self.read_ahead = self.reading = None
+        self.progress = False
+        try:
+            if cfg.registry:
+                asset.uproject.registry = uregistry.AssetRegistry(asset.uproject)
+                asset.uproject.registry.Update()
+            if cfg.prefetch:
+                self.plan = uprefetch.PrefetchPlan(asset.uproject, uprefetch.ConsumedClasses(cfg.meshes, cfg.meshes and cfg.materials), asset.GetPackageImports())
+                self.plan.Report()
+                self.prefetching = self.plan.Run(lod=cfg.lod, poll_s=0.002)
+            if uasset.read_ahead_threads and not (self.plan and self.plan.UsesPool()): # Pool workers read their own packages
+                if self.plan: filepaths = self.plan.ReadOrder(cfg.lod)
+                else: filepaths = [asset.ToProjectPath(imp.object_name) for imp in asset.imports if imp.class_name == 'Package' and imp.object_name.startswith(("/Game/", "/Engine/"))]
+                uasset.read_ahead = self.read_ahead = uasset.ReadAhead(filepaths)
+            bpy.context.window_manager.progress_begin(0, len(asset.exports))
+            self.progress = True
+
+            if cfg.folders:
+                map_coll = bpy.data.collections.new(os.path.splitext(os.path.basename(filepath))[0])
+                bpy.context.scene.collection.children.link(map_coll)
+                bpy.context.view_layer.active_layer_collection = bpy.context.view_layer.layer_collection.children[map_coll.name]
+            self.collection = bpy.context.collection
+            self.assembly = SceneAssembly(self.collection, cfg.folders) if batch_assembly else None
+            self.instancer = MeshInstancer(cfg, self.collection)
+        except BaseException: # No job to Finish(), don't leave threads, the map's mapping or the progress bar behind
+            self.Release()
+            raise
+        self.i_export = 0
+        self.t_exports = None
+    def Step(self, budget:float) -> bool: # True once every export is processed
+        global assembly, collection
+        t_end = time.perf_counter() + budget
+        assembly, collection = (self.assembly, self.collection)
+        try:
+            while self.prefetching:
+                try: next(self.prefetching)
+                except StopIteration: self.prefetching = None
+                if time.perf_counter() >= t_end: return False
+            exports = self.asset.exports
+            if self.t_exports is None:
+                if not self.reading: self.reading = self.asset.RunReadExports(exports, False) # Every export in file order, children included, before ProcessUMapExport visits them in table order
+                for _ in self.reading:
+                    if time.perf_counter() >= t_end: return False
+                self.t_exports = time.perf_counter()
+            while self.i_export < len(exports):
+                export = exports[self.i_export]
+                with uprofile.Span(export.export_class_type or "None", "export"): ProcessUMapExport(export, self.cfg, self.instancer)
+                self.i_export += 1
+                if time.perf_counter() >= t_end: break
+            bpy.context.window_manager.progress_update(self.i_export)
+        finally: assembly = collection = None
+        return self.i_export >= len(exports)
+    def Cancel(self): # Stops prefetching & further exports, Finish() still assembles the ones processed into a consistent partial scene
+        self.cancelled = True
+        if self.prefetching:
+            self.prefetching.close()
+            self.prefetching = None
+    def Release(self): # Undoes __init__: progress, prefetching & read ahead threads, the map package and the registry
+        if self.progress: bpy.context.window_manager.progress_end()
+        if self.prefetching:
+            self.prefetching.close()
+            self.prefetching = None
+        self.asset_ref.__exit__(None, None, None)
+        if read_ahead := self.read_ahead:
+            self.read_ahead = uasset.read_ahead = None
+            read_ahead.Stop()
+            print(read_ahead)
+        uasset.uasset_cache.Remove(self.filepath) # Map exports hold Blender objects
+        uasset.uasset_cache.CloseHandles()
+        if registry := self.asset.uproject.registry:
+            registry.Close()
+            self.asset.uproject.registry = None # Cached packages share this uproject, IsA falls back to opening packages until an import sets it again
+    def Status(self) -> str:
+        name = os.path.basename(self.filepath)
+        if self.prefetching: return f"{name}: Prefetching {self.plan.c_published}/{len(self.plan)} Packages"
+        c_exports = len(self.asset.exports)
+        eta = (c_exports - self.i_export) * (time.perf_counter() - self.t_exports) / self.i_export if self.i_export else 0
+        return f"{name}: {self.i_export}/{c_exports} Exports, {len(bpy.data.objects) - self.counts[0]} Objects, ETA {eta:.0f}s"
+    @uprofile.Spanned("umap")
+    def Finish(self):
+        global assembly, collection
+        assembly, collection = (self.assembly, self.collection)
+        try:
+            self.instancer.Build()
+            if assembly: assembly.Finish()
+        finally:
+            assembly = collection = None
+            self.Release()
+        asset = self.asset
+        obj_count, mesh_count, mat_count, light_count = self.counts
+        uasset.uasset_cache.Report()
+        print(f"Imported {asset}: {(time.time() - self.t0) * 1000:.2f}ms" + (f", Cancelled after {self.i_export}/{len(asset.exports)} Exports" if self.cancelled else ""))
+        print(f"{len(bpy.data.objects) - obj_count} Objects, {len(bpy.data.meshes) - mesh_count} Meshes, {len(bpy.data.materials) - mat_count} Materials, {len(bpy.data.lights) - light_count} Lights")
+        if len(bpy.data.lights) > 128: print(f"Warning, Exceeded Eevee's 128 Light Limit! ({len(bpy.data.lights)})")
+@uprofile.Spanned("umap")
 def LoadUMap(filepath, cfg=UMapImportSettings()):
-    t0 = time.time()
-
-    obj_count   = len(bpy.data.objects)
-    mesh_count  = len(bpy.data.meshes)
-    mat_count   = len(bpy.data.materials)
-    light_count = len(bpy.data.lights)
-
-    with UAsset(filepath) as asset:
-        bpy.context.window_manager.progress_begin(0, len(asset.exports))
-
-        if cfg.folders:
-            map_coll = bpy.data.collections.new(os.path.splitext(os.path.basename(filepath))[0])
-            bpy.context.scene.collection.children.link(map_coll)
-            bpy.context.view_layer.active_layer_collection = bpy.context.view_layer.layer_collection.children[map_coll.name]
-
-        for i, export in enumerate(asset.exports):
-            ProcessUMapExport(export, cfg)
-            bpy.context.window_manager.progress_update(i)
-        bpy.context.window_manager.progress_end()
-    if hasattr(asset, 'import_cache'):
-        for imp_asset in asset.import_cache.values(): imp_asset.Close()
-    print(f"Imported {asset}: {(time.time() - t0) * 1000:.2f}ms")
-    print(f"{len(bpy.data.objects) - obj_count} Objects, {len(bpy.data.meshes) - mesh_count} Meshes, {len(bpy.data.materials) - mat_count} Materials, {len(bpy.data.lights) - light_count} Lights")
-    if len(bpy.data.lights) > 128: print(f"Warning, Exceeded Eevee's 128 Light Limit! ({len(bpy.data.lights)})")
+    job = UMapImportJob(filepath, cfg)
+    try:
+        while not job.Step(math.inf): pass
+    finally: job.Finish()
 
 def menu_import_umap(self, context): self.layout.operator(ImportUMap.bl_idname, text="UE Map (.umap)")
 class ImportUMap(bpy.types.Operator, ImportHelper):
@@ -281,14 +632,62 @@ class ImportUMap(bpy.types.Operator, ImportHelper):
     force_shadows:    BoolProperty(name="Force Shadows",      default=False, description="Force all lights to cast shadows.")
     light_intensity:  FloatProperty(name="Light Brightness",  default=1, min=0, description="Optional multiplier for light intensity.")
     light_angle_coef: FloatProperty(name="Light Angle",       default=1, min=0, description="Optional multiplier for spotlight angle.")
-
+    registry:         BoolProperty(name="Asset Registry",     default=False, description="Index project & engine Content (incremental) to look up classes and dependencies without opening packages.")
+    prefetch:         BoolProperty(name="Prefetch",           default=True, description="Plan the map's package closure (meshes, materials, textures, blueprints) and parse it before building.")
+    lod:              IntProperty(name="LOD",                 default=0, min=0, description="Mesh level of detail to import, meshes with fewer LODs use their last.")
+    lowest_lod:       BoolProperty(name="Lowest LOD",         default=False, description="Import each mesh's LOD with the fewest triangles instead, for proxies & previews.")
+    instance_meshes:  BoolProperty(name="Instance Meshes",    default=False, description="Static Mesh Actors sharing a mesh & material overrides become one geometry nodes point cloud, actor names & folders kept as point attributes.")
+    profile:          BoolProperty(name="Profile",            default=False, description="Time import phases, print a summary and write a Chrome trace to the project's Export/Profile folder.")
+    background:       BoolProperty(name="Background",         default=False, description="Import in short slices between redraws, Blender stays responsive. Progress in the status bar, Esc cancels & keeps what was imported.")
+
+    def Settings(self):
+        return UMapImportSettings(self.folders, self.meshes, self.materials, self.cameras, self.lights_point, self.lights_spot, self.lights_dir, 
+                                  self.cubemaps, self.lightprobes, self.force_shadows, self.light_intensity, self.light_angle_coef, self.registry, self.prefetch,
+                                  udecode.lod_lowest_poly if self.lowest_lod else self.lod, self.instance_meshes)
     def execute(self, context):
-        for file in self.files:
-            if file.name != "":
-                cfg = UMapImportSettings(self.folders, self.meshes, self.materials, self.cameras, self.lights_point, self.lights_spot, self.lights_dir, 
-                                         self.cubemaps, self.lightprobes, self.force_shadows, self.light_intensity, self.light_angle_coef)
-                LoadUMap(self.directory + file.name, cfg)
+        filepaths = [self.directory + file.name for file in self.files if file.name != ""]
+        if self.background:
+            self._filepaths, self._cfg, self._job = (filepaths, self.Settings(), None)
+            self._timer = context.window_manager.event_timer_add(0.001, window=context.window)
+            context.window_manager.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+        for filepath in filepaths:
+            if self.profile: uprofile.Begin()
+            try: LoadUMap(filepath, self.Settings())
+            finally:
+                if self.profile: uprofile.End(os.path.join(uasset.UProject(filepath).dir, "Export", "Profile"))
         return {'FINISHED'}
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            if job := self._job: job.Cancel()
+            self.report({'WARNING'}, f"UMap import cancelled{f' after {job.i_export}/{len(job.asset.exports)} Exports' if job else ''}")
+            return self.EndModal(context, {'CANCELLED'})
+        if event.type != 'TIMER': return {'PASS_THROUGH'}
+        try:
+            if not self._job:
+                if not self._filepaths: return self.EndModal(context, {'FINISHED'})
+                if self.profile: uprofile.Begin()
+                self._job = UMapImportJob(self._filepaths.pop(0), self._cfg)
+            elif self._job.Step(slice_ms * 0.001):
+                self.FinishJob()
+                if not self._filepaths: return self.EndModal(context, {'FINISHED'})
+                return {'PASS_THROUGH'}
+            context.workspace.status_text_set(f"{self._job.Status()}    (Esc to Cancel)")
+        except Exception as e:
+            self.report({'ERROR'}, f"UMap import failed: {e}")
+            if self._job: self._job.Cancel()
+            return self.EndModal(context, {'CANCELLED'})
+        return {'PASS_THROUGH'}
+    def FinishJob(self):
+        job, self._job = (self._job, None)
+        try: job.Finish()
+        finally:
+            if self.profile: uprofile.End(os.path.join(job.asset.uproject.dir, "Export", "Profile"))
+    def EndModal(self, context, result):
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
+        if self._job: self.FinishJob()
+        return result
 
 reg_classes = ( ImportUMap, )
 
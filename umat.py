@@ -7,8 +7,8 @@ from bpy_extras.io_utils import ImportHelper
 
 cur_dir = os.path.dirname(__file__)
 if cur_dir not in sys.path: sys.path.append(cur_dir)
-import uasset, register_helper
-from uasset import UAsset, Import, Export, Properties, UProperty
+import uasset, uregistry, uprofile, register_helper
+from uasset import UAsset, UProject, Import, Export, Properties, UProperty
 
 umodel_path = cur_dir + r"\umodel.exe"
 mute_ior = True
@@ -23,6 +23,9 @@ def TryAppendNodeGroups():
                 bpy.ops.wm.append(filepath=str(node_tree_path / node_group), directory=str(node_tree_path), filename=node_group, set_fake=True)
 
 def TryGetExtractedImport(imp:Import, extract_dir):
+    if getattr(imp, "extracted", None): # Imports outlive imports in uasset_cache, the image may have been removed since
+        try: imp.extracted.name
+        except ReferenceError: del imp.extracted
     if not hasattr(imp, "extracted"):
         archive_path = imp.import_ref.object_name
         extracted_path = os.path.normpath(extract_dir + archive_path + ".png")
@@ -30,9 +33,9 @@ def TryGetExtractedImport(imp:Import, extract_dir):
             asset_path = imp.asset.ToProjectPath(archive_path)
             extract_dir = os.path.join(extract_dir, "Engine" if archive_path.startswith("/Engine/") else "Game")
             print(f"Extracting {asset_path}")
-            subprocess.run(f"\"{umodel_path}\" -export -png -out=\"{extract_dir}\" \"{asset_path}\"")
+            with uprofile.Span("umodel", "texture", package=asset_path): subprocess.run(f"\"{umodel_path}\" -export -png -out=\"{extract_dir}\" \"{asset_path}\"")
         try:
-            imp.extracted = tex = bpy.data.images.load(extracted_path, check_existing=True)
+            with uprofile.Span("images.load", "texture", path=extracted_path): imp.extracted = tex = bpy.data.images.load(extracted_path, check_existing=True)
 
             tex_uasset_path = imp.asset.ToProjectPath(archive_path)
             with UAsset(tex_uasset_path, uproject=imp.asset.uproject) as asset:
@@ -420,6 +423,7 @@ def ImportMaterialFunction(mat_fnc_imp:Import, mesh=None):
     node_graph_name = mat_fnc_imp.object_name
     if node_graph_name not in bpy.data.node_groups: ImportNodeGraph(mat_fnc_imp.asset.ToProjectPath(mat_fnc_imp.import_ref.object_name), mat_fnc_imp.asset.uproject, mesh=mesh)
     return node_graph_name
+@uprofile.Spanned("material")
 def ImportNodeGraph(filepath, uproject=None, name=None, mesh=None, log=False): # TODO: return asset?
     t0 = time.time()
     '''if not os.path.exists(filepath):
@@ -439,7 +443,7 @@ def ImportNodeGraph(filepath, uproject=None, name=None, mesh=None, log=False): #
                     if not name: name = exp.object_name
                     out = mat = bpy.data.materials.new(name)
                     mat.use_nodes = True
-                    mat["UAsset"] = asset.f.byte_stream.name
+                    mat["UAsset"] = asset.filepath
                     node_tree = mat.node_tree
                     node = node_tree.nodes['Principled BSDF']
                     SetNodePos(node, params, 'EditorX', 'EditorY')
@@ -533,11 +537,14 @@ def ImportNodeGraph(filepath, uproject=None, name=None, mesh=None, log=False): #
     if log: print(f"Imported {mat.name}: {(time.time() - t0) * 1000:.2f}ms")
     return (out, graph_data)
 def TryGetUMaterialImport(mat_imp:Import, mesh=None):
-    mat = bpy.data.materials.get(mat_imp.object_name)
-    if not mat:
-        umat_path = mat_imp.asset.ToProjectPath(mat_imp.import_ref.object_name)
-        try: mat, graph_data = ImportNodeGraph(umat_path, mat_imp.asset.uproject, mesh=mesh)
-        except Exception as e: print(f"Failed to Import {mat_imp.object_name}: {e}")
+    if mat := bpy.data.materials.get(mat_imp.object_name): return mat
+    return TryGetUMaterial(mat_imp.object_name, mat_imp.import_ref.object_name, mat_imp.asset.uproject, mesh)
+def TryGetUMaterial(name:str, package_path:str, uproject:UProject, mesh=None): # Without the referencing package, for cached meshes
+    mat = bpy.data.materials.get(name)
+    if not mat and not uregistry.IsA(uproject, package_path, ('Material','MaterialInstanceConstant')): print(f"Skipping \"{package_path}\", Registry has no Material Package")
+    elif not mat:
+        try: mat, graph_data = ImportNodeGraph(uproject.ToProjectPath(package_path), uproject, mesh=mesh)
+        except Exception as e: print(f"Failed to Import {name}: {e}")
     return mat
 
 def menu_import_umat(self, context): self.layout.operator(ImportUMat.bl_idname, text="UE Material (.uasset)")
@@ -550,9 +557,16 @@ class ImportUMat(bpy.types.Operator, ImportHelper):
     files:       CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN','SKIP_SAVE'})
     directory:   StringProperty(options={'HIDDEN'})
 
+    profile:     BoolProperty(name="Profile", default=False, description="Time import phases, print a summary and write a Chrome trace to the project's Export/Profile folder.")
+
     def execute(self, context):
-        for file in self.files:
-            if file.name != "": ImportNodeGraph(self.directory + file.name)
+        if self.profile: uprofile.Begin()
+        try:
+            for file in self.files:
+                if file.name != "": ImportNodeGraph(self.directory + file.name)
+        finally:
+            uasset.uasset_cache.CloseHandles()
+            if self.profile: uprofile.End(os.path.join(uasset.UProject(self.directory + self.files[0].name).dir, "Export", "Profile"))
         return {'FINISHED'}
 
 reg_classes = ( ImportUMat, )
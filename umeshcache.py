@@ -0,0 +1,83 @@
+import os, sys, json, mmap, struct, hashlib
+import numpy as np
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+import uasset, udecode, uprofile
+from uasset import UProject
+
+# Decoded mesh cache, no bpy. One file per package & LOD in the project's Export/MeshCache, keyed by path and validated against the package's size & mtime
+# Layout: magic, header length, JSON header (mesh_data tree with arrays replaced by { '__array__':i }), then each array aligned so Load maps them in place
+use_mesh_cache = True
+mesh_cache_version = 1 # Bump when udecode's output changes
+magic = b'UMC\0'
+align = 64
+
+def CachePath(filepath:str, uproject:UProject, lod=0) -> str:
+    lod_name = "Lowest" if lod == udecode.lod_lowest_poly else str(lod)
+    return os.path.join(uproject.dir, "Export", "MeshCache", f"{hashlib.md5(os.path.normcase(os.path.normpath(filepath)).encode()).hexdigest()}_LOD{lod_name}.bin")
+def Stamp(filepath:str):
+    file_stat = os.stat(filepath)
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+def AlignUp(offset:int) -> int: return (offset + align - 1) & ~(align - 1)
+
+def Flatten(value, arrays:list):
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value))
+        return { '__array__':len(arrays) - 1 }
+    if isinstance(value, dict): return { key:Flatten(v, arrays) for key, v in value.items() }
+    if isinstance(value, (list, tuple)): return [Flatten(v, arrays) for v in value]
+    if isinstance(value, np.generic): return value.item()
+    return value
+def Unflatten(value, arrays:list):
+    if isinstance(value, dict): return arrays[value['__array__']] if '__array__' in value else { key:Unflatten(v, arrays) for key, v in value.items() }
+    if isinstance(value, list): return [Unflatten(v, arrays) for v in value]
+    return value
+
+def Save(filepath:str, uproject:UProject, kind:str, name:str, data:dict, lod=0, stamp=None): # data is mesh_data with material_refs, tuples come back as lists
+    arrays = []
+    header = { 'version':mesh_cache_version, 'stamp':list(stamp) if stamp else Stamp(filepath), 'kind':kind, 'name':name, 'data':Flatten(data, arrays), 'arrays':[] }
+    offset = 0
+    for array in arrays:
+        header['arrays'].append({ 'dtype':array.dtype.str, 'shape':array.shape, 'offset':offset })
+        offset = AlignUp(offset + array.nbytes)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    data_start = AlignUp(len(magic) + 4 + len(header_bytes))
+    cache_path = CachePath(filepath, uproject, lod)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with uprofile.Span("MeshCache.Save", "cache"), open(cache_path + ".tmp", 'wb') as file:
+            file.write(magic + struct.pack('<I', len(header_bytes)) + header_bytes)
+            for array, desc in zip(arrays, header['arrays']):
+                file.seek(data_start + desc['offset'])
+                file.write(array.data)
+            file.truncate(data_start + offset)
+        os.replace(cache_path + ".tmp", cache_path)
+    except OSError as e: print(f"Failed writing mesh cache for \"{filepath}\": {e}")
+def ReadHeader(cache_path:str, filepath:str):
+    with open(cache_path, 'rb') as file:
+        if file.read(len(magic)) != magic: return None
+        header = json.loads(file.read(struct.unpack('<I', file.read(4))[0]))
+    if header['version'] != mesh_cache_version or header['stamp'] != Stamp(filepath): return None
+    return header
+def IsValid(filepath:str, uproject:UProject, lod=0) -> bool:
+    try: return ReadHeader(CachePath(filepath, uproject, lod), filepath) is not None
+    except (OSError, ValueError, KeyError, struct.error): return False
+def Load(filepath:str, uproject:UProject, lod=0) -> dict: # { kind, name, data }, arrays are read only views of the mapping, None when missing or stale
+    cache_path = CachePath(filepath, uproject, lod)
+    try:
+        if not (header := ReadHeader(cache_path, filepath)): return None
+        with uprofile.Span("MeshCache.Load", "cache"), open(cache_path, 'rb') as file:
+            buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # Arrays keep the mapping alive, the handle isn't needed past here
+            data_start = AlignUp(len(magic) + 4 + struct.unpack_from('<I', buf, len(magic))[0])
+            arrays = []
+            for desc in header['arrays']:
+                dtype, shape = (np.dtype(desc['dtype']), tuple(desc['shape']))
+                count = int(np.prod(shape))
+                arrays.append(np.frombuffer(buf, dtype, count, data_start + desc['offset']).reshape(shape) if count else np.empty(shape, dtype))
+        uprofile.Count('mesh_cache_hits', 1, filepath, header['kind'])
+        return { 'kind':header['kind'], 'name':header['name'], 'data':Unflatten(header['data'], arrays) }
+    except FileNotFoundError: return None
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"Ignoring mesh cache for \"{filepath}\": {e}")
+        return None
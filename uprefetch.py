@@ -0,0 +1,151 @@
+import os, sys, time, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+
+import uasset, udecode, umeshcache, uprofile
+from uasset import UAsset, UProject
+
+est_package_ms = 2.0 # Rough fixed cost to open & read a package's properties
+est_decode_mbps = 40.0 # Rough property & bulk decode throughput
+prefetch_max_mb = 4096 # Over budget plans are reported but not read ahead
+workers = os.cpu_count() or 1 # Process pool size, 1 reads in process
+pool_min_cost = 2.0 # Estimated seconds before spawning workers pays off
+
+mesh_classes = ('StaticMesh', 'SkeletalMesh')
+material_classes = ('Material', 'MaterialInstanceConstant', 'MaterialFunction')
+texture_classes = ('Texture2D',)
+blueprint_classes = ('Blueprint',)
+leaf_classes = texture_classes # Consumed without following their imports
+
+def ReadAhead(asset:UAsset, cls:str, lod=0): # Mirror how umap/umesh/umat read each kind of package
+    if cls in material_classes:
+        asset.ReadExports(asset.exports, False)
+        asset.read_all = True
+    elif cls in mesh_classes:
+        if umeshcache.use_mesh_cache and umeshcache.IsValid(asset.filepath, asset.uproject, lod): return # Built from the mesh cache, nothing to decode
+        for export in asset.exports:
+            if export.export_class_type == cls: udecode.DecodeMesh(export, lod)
+    elif cls in texture_classes:
+        for export in asset.exports:
+            if export.export_class_type == cls: export.ReadProperties(False, False)
+    elif cls in blueprint_classes:
+        asset.EnsureIndexExports()
+        asset.ReadExports([export for export in asset.exports if export.object_name.endswith("_GEN_VARIABLE")])
+def ReadPackage(filepath:str, uproject:UProject, cls:str, pkg:UAsset=None, lod=0) -> UAsset: # Also the process pool entry point, no bpy
+    if not pkg:
+        pkg = UAsset(filepath, uproject=uproject)
+        pkg.Read(False)
+    pkg.lazy = cls in blueprint_classes
+    ReadAhead(pkg, cls, lod)
+    pkg.Close() # Bound open handles, consumers remap on demand
+    return pkg
+
+class PrefetchPlan: # Transitive package closure of a map or set of files, in breadth first (import) order
+    @uprofile.Spanned("prefetch")
+    def __init__(self, uproject:UProject, classes, packages=(), files=()):
+        t0 = time.time()
+        self.uproject = uproject
+        self.packages:dict[str,tuple] = {} # package path (or filepath for roots) -> (filepath, class, size)
+        self.headers:dict[str,UAsset] = {}
+        self.missing:list[str] = []
+        self.c_published = 0
+        registry = uproject.registry
+        queue = deque([(os.path.normpath(filepath), filepath) for filepath in files] + [(path, None) for path in sorted(packages)])
+        seen = { path for path, filepath in queue }
+        c_skipped = 0
+        while queue:
+            path, filepath = queue.popleft()
+            if not filepath and not path.startswith(("/Game/", "/Engine/")): continue # /Script
+            if not filepath and registry and registry.Covers(path):
+                if not (filepath := registry.GetFile(path)):
+                    self.missing.append(path)
+                    continue
+                cls, depends = (registry.GetClass(path), registry.GetDependencies(path))
+            else:
+                if not filepath: filepath = uproject.ToProjectPath(path)
+                if not os.path.exists(filepath):
+                    self.missing.append(path)
+                    continue
+                try:
+                    header = UAsset(filepath, uproject=uproject)
+                    header.Read(False)
+                    header.f.Close()
+                except Exception as e:
+                    print(f"Prefetch: Failed reading \"{filepath}\": {e}")
+                    continue
+                cls = main_export.export_class_type if (main_export := header.GetMainExport()) else None
+                depends = header.GetPackageImports()
+                self.headers[path] = header
+            if cls not in classes or (cls in blueprint_classes and path.startswith("/Engine/")): # umap skips engine blueprints
+                c_skipped += 1
+                continue
+            self.packages[path] = (filepath, cls, os.path.getsize(filepath))
+            if cls in leaf_classes: continue
+            for dep in depends:
+                if dep not in seen:
+                    seen.add(dep)
+                    queue.append((dep, None))
+        for path in self.headers.keys() - self.packages.keys(): self.headers[path].Close()
+        self.c_skipped = c_skipped
+        self.plan_time = time.time() - t0
+    def __len__(self): return len(self.packages)
+    def TotalBytes(self): return sum(size for filepath, cls, size in self.packages.values())
+    def EstimatedCost(self): return len(self.packages) * est_package_ms * 0.001 + self.TotalBytes() / (est_decode_mbps * 1024 * 1024)
+    def UsesPool(self): return min(workers, len(self.packages)) > 1 and self.EstimatedCost() >= pool_min_cost
+    def ReadOrder(self, lod=0) -> list[str]: # Files Run() opens in process, in the order it opens them (uasset.ReadAhead)
+        return [filepath for filepath, cls, size in self.packages.values() if not (cls in mesh_classes and umeshcache.use_mesh_cache and umeshcache.IsValid(filepath, self.uproject, lod))]
+    def Report(self):
+        counts = {}
+        for filepath, cls, size in self.packages.values(): counts[cls] = counts.get(cls, 0) + 1
+        print(f"Prefetch Plan: {len(self.packages)} Packages ({', '.join(f'{c} {cls}' for cls, c in sorted(counts.items()))}), {self.TotalBytes() / (1024 * 1024):.1f} MB, est. {self.EstimatedCost():.1f}s")
+        print(f"    {len(self.missing)} Missing, {self.c_skipped} Unused, planned in {self.plan_time * 1000:.2f}ms")
+    @uprofile.Spanned("prefetch")
+    def Prefetch(self, log=True, lod=0): # Parse the closure ahead, the build phase picks it up through uasset.uasset_cache. lod as given to the mesh importers
+        for _ in self.Run(log, lod): pass
+    def Run(self, log=True, lod=0, poll_s=None): # Prefetch in steps, yields after each package read in process or each pool poll (poll_s, None waits for one) so callers can time slice it
+        if self.TotalBytes() > prefetch_max_mb * 1024 * 1024:
+            print(f"Prefetch: Closure exceeds {prefetch_max_mb} MB budget, reading on demand")
+            return
+        t0 = time.time()
+        pending = self.packages.copy()
+        c_workers = min(workers, len(pending))
+        if self.UsesPool():
+            for header in self.headers.values(): header.Close()
+            self.headers.clear()
+            try: # Spawned workers run headless, parsed packages are pickled back without their streams
+                with ProcessPoolExecutor(c_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    futures = { pool.submit(ReadPackage, filepath, self.uproject, cls, None, lod):path for path, (filepath, cls, size) in pending.items() }
+                    try:
+                        while futures:
+                            done, _ = wait(futures, poll_s, FIRST_COMPLETED)
+                            for future in done:
+                                path = futures.pop(future)
+                                try: self.Publish(future.result())
+                                except Exception as e: print(f"Prefetch: Failed reading \"{pending[path][0]}\": {e}")
+                                del pending[path]
+                            yield
+                    except GeneratorExit: # Cancelled, only wait for packages already being read
+                        pool.shutdown(cancel_futures=True)
+                        raise
+            except Exception as e: print(f"Prefetch: Process pool failed ({e}), reading in process")
+        else: c_workers = 1
+        for path, (filepath, cls, size) in pending.items():
+            try: self.Publish(ReadPackage(filepath, self.uproject, cls, self.headers.get(path), lod))
+            except Exception as e: print(f"Prefetch: Failed reading \"{filepath}\": {e}")
+            yield
+        self.headers.clear()
+        if log: print(f"Prefetched {len(self.packages)} Packages on {c_workers} Process{'es' if c_workers > 1 else ''} in {time.time() - t0:.2f}s")
+    def Publish(self, pkg:UAsset):
+        pkg.uproject = self.uproject
+        uasset.uasset_cache.Put(pkg)
+        self.c_published += 1
+
+def ConsumedClasses(meshes=True, materials=True, blueprints=True):
+    classes = ()
+    if meshes: classes += mesh_classes
+    if materials: classes += material_classes + texture_classes
+    if blueprints: classes += blueprint_classes
+    return classes
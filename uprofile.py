@@ -0,0 +1,116 @@
+import os, time, json, threading, functools
+
+# Hierarchical import profiler, no bpy. Off by default, Span() then hands back a shared no-op and Count() returns immediately
+enabled = False
+report_top = 15 # Packages & classes listed per counter table
+
+class NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *args): return False
+null_span = NullSpan()
+
+class SpanFrame:
+    __slots__ = ('name', 'cat', 'args', 'path', 't0', 't_children')
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args, self.t_children = (name, cat, args, 0)
+    def __enter__(self):
+        stack = profiler.Stack()
+        self.path = f"{stack[-1].path}/{self.name}" if stack else self.name
+        stack.append(self)
+        self.t0 = time.perf_counter_ns()
+        return self
+    def __exit__(self, *args):
+        t1 = time.perf_counter_ns()
+        stack = profiler.Stack()
+        stack.pop()
+        dur = t1 - self.t0
+        if stack: stack[-1].t_children += dur
+        profiler.Record(self, dur)
+        return False
+
+class Profiler:
+    def __init__(self): self.Reset()
+    def Reset(self):
+        self.t_origin = time.perf_counter_ns()
+        self.events:list[tuple] = [] # (name, cat, ts ns, dur ns, tid, args)
+        self.totals:dict[str,list] = {} # span path -> [calls, total ns, self ns]
+        self.counters:dict[str,dict[str,dict[str,int]]] = { 'package':{}, 'class':{}, 'total':{ '':{} } } # scope -> key -> counter -> value
+        self.local = threading.local()
+        self.lock = threading.Lock()
+    def Stack(self) -> list[SpanFrame]:
+        stack = getattr(self.local, 'stack', None)
+        if stack is None: self.local.stack = stack = []
+        return stack
+    def Record(self, frame:SpanFrame, dur:int):
+        with self.lock:
+            self.events.append((frame.name, frame.cat, frame.t0 - self.t_origin, dur, threading.get_ident(), frame.args))
+            if not (total := self.totals.get(frame.path)): self.totals[frame.path] = total = [0, 0, 0]
+            total[0] += 1
+            total[1] += dur
+            total[2] += dur - frame.t_children
+    def Count(self, name:str, value:int, package:str, cls:str):
+        with self.lock:
+            for scope, key in (('total', ''), ('package', package), ('class', cls)):
+                if key is None: continue
+                counters = self.counters[scope].setdefault(key, {})
+                counters[name] = counters.get(name, 0) + value
+
+    def Report(self):
+        print("Profile:")
+        print(f"    {'Span':<60} {'Calls':>8} {'Total ms':>11} {'Self ms':>11} {'%':>6}")
+        root_total = sum(total for path, (calls, total, self_t) in self.totals.items() if '/' not in path) or 1
+        for path in sorted(self.totals):
+            calls, total, self_t = self.totals[path]
+            depth = path.count('/')
+            print(f"    {'  ' * depth + path.rsplit('/', 1)[-1]:<60} {calls:>8} {total / 1e6:>11.2f} {self_t / 1e6:>11.2f} {100 * total / root_total:>6.1f}")
+        if totals := self.counters['total']['']: print("    " + ", ".join(f"{name} {value:,}" for name, value in sorted(totals.items())))
+        for scope in ('package', 'class'):
+            rows = self.counters[scope]
+            if not rows: continue
+            names = sorted({ name for counters in rows.values() for name in counters })
+            sort_name = 'bytes_read' if 'bytes_read' in names else names[0]
+            print(f"    {'By ' + scope.capitalize():<40} " + " ".join(f"{name:>14}" for name in names))
+            for key, counters in sorted(rows.items(), key=lambda item: -item[1].get(sort_name, 0))[:report_top]:
+                print(f"    {os.path.basename(key)[:40]:<40} " + " ".join(f"{counters.get(name, 0):>14,}" for name in names))
+    def TraceEvents(self) -> list[dict]: # Chrome trace_event format, complete ("X") events in microseconds
+        pid = os.getpid()
+        events = [{ 'name':name, 'cat':cat or "", 'ph':'X', 'ts':ts / 1000, 'dur':dur / 1000, 'pid':pid, 'tid':tid, **({ 'args':args } if args else {}) } for name, cat, ts, dur, tid, args in self.events]
+        t_end = max((ts + dur for name, cat, ts, dur, tid, args in self.events), default=0) / 1000
+        for key, counters in self.counters['package'].items(): events.append({ 'name':os.path.basename(key), 'cat':'package', 'ph':'C', 'ts':t_end, 'pid':pid, 'tid':0, 'args':counters })
+        return events
+    def SaveTrace(self, filepath:str):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as file: json.dump({ 'traceEvents':self.TraceEvents(), 'displayTimeUnit':'ms' }, file)
+        return filepath
+profiler = Profiler()
+
+def Span(name:str, cat:str=None, **args):
+    if not enabled: return null_span
+    return SpanFrame(name, cat, args)
+def Count(name:str, value:int=1, package:str=None, cls:str=None):
+    if enabled: profiler.Count(name, value, package, cls)
+
+def Spanned(cat:str=None): # Decorator for coarse phases, costs one extra call when off
+    def Decorate(fn):
+        @functools.wraps(fn)
+        def Wrapper(*args, **kwargs):
+            if not enabled: return fn(*args, **kwargs)
+            with SpanFrame(fn.__qualname__, cat, None): return fn(*args, **kwargs)
+        return Wrapper
+    return Decorate
+
+def Begin():
+    global enabled
+    profiler.Reset()
+    enabled = True
+def End(trace_dir:str=None, report=True): # Stops profiling, prints the summary table and writes a Chrome trace (chrome://tracing, ui.perfetto.dev)
+    global enabled
+    if not enabled: return None
+    enabled = False
+    if report: profiler.Report()
+    if not trace_dir: return None
+    try:
+        trace_path = profiler.SaveTrace(os.path.join(trace_dir, time.strftime("Trace_%Y%m%d_%H%M%S.json")))
+        print(f"Profile trace written to \"{trace_path}\"")
+        return trace_path
+    except OSError as e: print(f"Failed writing profile trace: {e}")
@@ -0,0 +1,103 @@
+import os, sys, time, sqlite3
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+
+import uprofile, uasset
+from uasset import UAsset, UProject
+
+registry_version = 1
+package_exts = ('.uasset', '.umap')
+
+class AssetRegistry: # Header-only index of every package under the project & engine Content dirs
+    def __init__(self, uproject:UProject, engine=True, db_path=None):
+        self.uproject = uproject
+        self.mounts = { "/Game/":os.path.join(uproject.dir, "Content") }
+        if engine and os.path.normcase(os.path.normpath(uproject.engine_dir)) != os.path.normcase(os.path.normpath(uproject.dir)):
+            self.mounts["/Engine/"] = os.path.join(uproject.engine_dir, "Content")
+        if not db_path:
+            db_path = os.path.join(uproject.dir, "Export", "AssetRegistry.db")
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != registry_version:
+            self.db.executescript("DROP TABLE IF EXISTS packages; DROP TABLE IF EXISTS depends;")
+            self.db.execute(f"PRAGMA user_version = {registry_version}")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS packages (path TEXT PRIMARY KEY, file TEXT NOT NULL, size INTEGER, mtime INTEGER, class TEXT, object TEXT);
+            CREATE TABLE IF NOT EXISTS depends (package TEXT NOT NULL, dependency TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS depends_package ON depends(package);
+            CREATE INDEX IF NOT EXISTS depends_dependency ON depends(dependency);
+            CREATE INDEX IF NOT EXISTS packages_class ON packages(class);""")
+    def __enter__(self): return self
+    def __exit__(self, *args): self.Close()
+    def Close(self): self.db.close()
+    def __len__(self): return self.db.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    def ToPackagePath(self, filepath:str):
+        filepath = os.path.normcase(os.path.normpath(filepath))
+        for mount, content_dir in self.mounts.items():
+            content_dir = os.path.normcase(os.path.normpath(content_dir)) + os.sep
+            if filepath.startswith(content_dir): return mount + os.path.splitext(filepath[len(content_dir):])[0].replace(os.sep, '/')
+        return None
+    def Covers(self, package_path:str): return any(package_path.startswith(mount) for mount in self.mounts)
+    def IterPackageFiles(self):
+        for mount, content_dir in self.mounts.items():
+            for root, dirs, files in os.walk(content_dir):
+                for file in files:
+                    if file.endswith(package_exts):
+                        filepath = os.path.join(root, file)
+                        yield (mount + os.path.relpath(os.path.splitext(filepath)[0], content_dir).replace(os.sep, '/'), filepath)
+
+    @uprofile.Spanned("registry")
+    def Update(self, log=True): # Incremental, only packages whose size or mtime changed are re-read
+        t0 = time.time()
+        stamps = { path:(size, mtime) for path, size, mtime in self.db.execute("SELECT path, size, mtime FROM packages") }
+        seen = set()
+        c_indexed = c_failed = 0
+        with self.db:
+            for path, filepath in self.IterPackageFiles():
+                if path in seen: continue # .uasset & .umap of the same name
+                seen.add(path)
+                try: stat = os.stat(filepath)
+                except OSError: continue
+                if stamps.get(path) == (stat.st_size, stat.st_mtime_ns): continue
+                if not self.IndexPackage(path, filepath, stat): c_failed += 1
+                c_indexed += 1
+            removed = [(path,) for path in stamps.keys() - seen]
+            self.db.executemany("DELETE FROM packages WHERE path = ?", removed)
+            self.db.executemany("DELETE FROM depends WHERE package = ?", removed)
+        if log: print(f"Asset Registry: {len(seen)} Packages, {c_indexed} Indexed ({c_failed} Failed), {len(removed)} Removed in {time.time() - t0:.2f}s")
+    def IndexPackage(self, path:str, filepath:str, stat:os.stat_result):
+        cls = obj = None
+        depends = []
+        asset, use_header_cache = (None, uasset.use_header_cache)
+        uasset.use_header_cache = False # One pass over every package, a header cache file each would outnumber the hits
+        try:
+            asset = UAsset(filepath, uproject=self.uproject)
+            asset.Read(False)
+            if main_export := asset.GetMainExport(): cls, obj = (main_export.export_class_type, main_export.object_name)
+            depends = asset.GetPackageImports()
+            ok = True
+        except Exception as e:
+            print(f"Asset Registry: Failed reading \"{filepath}\": {e}")
+            ok = False
+        finally:
+            uasset.use_header_cache = use_header_cache
+            if asset: asset.Close()
+        self.db.execute("INSERT OR REPLACE INTO packages VALUES (?,?,?,?,?,?)", (path, filepath, stat.st_size, stat.st_mtime_ns, cls, obj))
+        self.db.execute("DELETE FROM depends WHERE package = ?", (path,))
+        self.db.executemany("INSERT INTO depends VALUES (?,?)", [(path, dep) for dep in depends])
+        return ok
+
+    def GetFile(self, package_path:str):
+        row = self.db.execute("SELECT file FROM packages WHERE path = ?", (package_path,)).fetchone()
+        return row[0] if row else None
+    def GetClass(self, package_path:str):
+        row = self.db.execute("SELECT class FROM packages WHERE path = ?", (package_path,)).fetchone()
+        return row[0] if row else None
+    def GetDependencies(self, package_path:str) -> list[str]: return [row[0] for row in self.db.execute("SELECT dependency FROM depends WHERE package = ?", (package_path,))]
+    def GetReferencers(self, package_path:str) -> list[str]: return [row[0] for row in self.db.execute("SELECT package FROM depends WHERE dependency = ?", (package_path,))]
+    def FindByClass(self, cls:str) -> list[str]: return [row[0] for row in self.db.execute("SELECT path FROM packages WHERE class = ?", (cls,))]
+    def IsA(self, package_path:str, classes): return not self.Covers(package_path) or self.GetClass(package_path) in classes # False only if indexed as missing or another class
+
+def IsA(uproject:UProject, package_path:str, classes): return not (registry := getattr(uproject, 'registry', None)) or registry.IsA(package_path, classes)
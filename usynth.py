@@ -0,0 +1,530 @@
+from __future__ import annotations
+import os, sys, math, uuid, struct, random, argparse
+
+cur_dir = os.path.dirname(__file__)
+if cur_dir not in sys.path: sys.path.append(cur_dir)
+
+# Writes synthetic, parseable .uasset/.umap packages mirroring the branches uasset.py reads
+
+v_obj_guid     = uuid.UUID('E4B068ED-42E9-F494-0BDA-31A241BB462E')
+v_ent_obj_guid = uuid.UUID('9DFFBCD6-0158-494F-8212-21E288A8923C')
+v_ren_guid     = uuid.UUID('12F88B9F-4AFC-8875-0CD9-7CA629BD3A38')
+v_skel_guid    = uuid.UUID('D78A4A00-4697-E858-B519-A8BAB4467D48')
+
+class Writer:
+    def __init__(self, pkg:SynthPackage): self.pkg, self.buf = (pkg, bytearray())
+    def __len__(self): return len(self.buf)
+    def Pack(self, fmt, *vals): self.buf += struct.pack('<' + fmt, *vals)
+    def Bytes(self, b): self.buf += b
+    def Int8(self, v): self.Pack('b', v)
+    def UInt8(self, v): self.Pack('B', v)
+    def Int16(self, v): self.Pack('h', v)
+    def UInt16(self, v): self.Pack('H', v)
+    def Int32(self, v): self.Pack('i', v)
+    def UInt32(self, v): self.Pack('I', v)
+    def Int64(self, v): self.Pack('q', v)
+    def Bool32(self, v): self.Pack('i', 1 if v else 0)
+    def Float(self, v): self.Pack('f', v)
+    def Guid(self, guid:uuid.UUID): self.buf += guid.bytes_le
+    def FString(self, s:str):
+        if s == "": self.Int32(0)
+        elif s.isascii():
+            self.Int32(len(s) + 1)
+            self.buf += s.encode('ascii') + b'\0'
+        else:
+            self.Int32(-(len(s) + 1))
+            self.buf += s.encode('utf-16-le') + b'\0\0'
+    def FName(self, s:str):
+        base, number = (s, 0)
+        if (i := s.rfind('_')) > 0 and s[i+1:].isdigit() and not s[i+1:].startswith('0'): base, number = (s[:i], int(s[i+1:]) + 1)
+        self.Pack('ii', self.pkg.Name(base), number)
+    def PropGuid(self):
+        if self.pkg.version_ue4 >= 503: self.UInt8(0)
+
+class Prop: # Tagged property, payload serialized without the tag header
+    def __init__(self, type:str, payload, header=None, header_fn=None):
+        self.type, self.payload, self.header_fn = (type, payload, header_fn)
+    def WriteTag(self, w:Writer, name:str, i_dupe=0):
+        payload = Writer(w.pkg)
+        self.payload(payload)
+        w.FName(name)
+        w.FName(self.type)
+        w.Int32(len(payload))
+        w.Int32(i_dupe)
+        if self.header_fn: self.header_fn(w)
+        else: w.PropGuid()
+        w.Bytes(payload.buf)
+
+def IntProp(v): return Prop("IntProperty", lambda w: w.Int32(v))
+def FloatProp(v): return Prop("FloatProperty", lambda w: w.Float(v))
+def StrProp(v): return Prop("StrProperty", lambda w: w.FString(v))
+def NameProp(v): return Prop("NameProperty", lambda w: w.FName(v))
+def ObjectProp(i_pkg): return Prop("ObjectProperty", lambda w: w.Int32(i_pkg))
+def BoolProp(v):
+    def header(w:Writer):
+        w.UInt8(1 if v else 0)
+        w.PropGuid()
+    return Prop("BoolProperty", lambda w: None, header_fn=header)
+def EnumProp(enum_type, v):
+    def header(w:Writer):
+        w.FName(enum_type)
+        w.PropGuid()
+    return Prop("EnumProperty", lambda w: w.FName(v), header_fn=header)
+def ByteEnumProp(enum_type, v):
+    def header(w:Writer):
+        w.FName(enum_type)
+        w.PropGuid()
+    return Prop("ByteProperty", lambda w: w.FName(v), header_fn=header)
+def StructHeader(struct_type):
+    def header(w:Writer):
+        w.FName(struct_type)
+        if w.pkg.version_ue4 >= 441: w.Guid(uuid.UUID(int=0))
+        w.PropGuid()
+    return header
+def VectorProp(x, y, z, struct_type="Vector"): return Prop("StructProperty", lambda w: w.Pack('fff', x, y, z), header_fn=StructHeader(struct_type))
+def RotatorProp(pitch, yaw, roll): return VectorProp(pitch, yaw, roll, "Rotator")
+def ColorProp(r, g, b, a=255): return Prop("StructProperty", lambda w: w.Pack('BBBB', b, g, r, a), header_fn=StructHeader("Color"))
+def TableProp(struct_type, props:dict): return Prop("StructProperty", lambda w: WriteProperties(w, props), header_fn=StructHeader(struct_type))
+def ArrayProp(inner_type, values:list, write_el):
+    def header(w:Writer):
+        w.FName(inner_type)
+        w.PropGuid()
+    def payload(w:Writer):
+        w.Int32(len(values))
+        for v in values: write_el(w, v)
+    return Prop("ArrayProperty", payload, header_fn=header)
+def IntArrayProp(values): return ArrayProp("IntProperty", values, Writer.Int32)
+def ObjectArrayProp(values): return ArrayProp("ObjectProperty", values, Writer.Int32)
+def StructArrayProp(name, struct_type, tables:list[dict]): # >= 500, each element a property table
+    def header(w:Writer):
+        w.FName("StructProperty")
+        w.PropGuid()
+    def payload(w:Writer):
+        w.Int32(len(tables))
+        elements = Writer(w.pkg)
+        for props in tables: WriteProperties(elements, props)
+        w.FName(name)
+        w.FName("StructProperty")
+        w.Int64(len(elements))
+        w.FName(struct_type)
+        w.Guid(uuid.UUID(int=0))
+        w.PropGuid()
+        w.Bytes(elements.buf)
+    return Prop("ArrayProperty", payload, header_fn=header)
+def WriteProperties(w:Writer, props:dict):
+    for name, prop in props.items():
+        if type(prop) is list:
+            for i_dupe, dupe in enumerate(prop): dupe.WriteTag(w, name, i_dupe)
+        else: prop.WriteTag(w, name)
+    w.FName("None")
+
+class SynthExport:
+    def __init__(self, pkg:SynthPackage, class_index, object_name, outer_index=0):
+        self.pkg, self.class_index, self.object_name, self.outer_index = (pkg, class_index, object_name, outer_index)
+        self.w = Writer(pkg)
+class SynthPackage:
+    def __init__(self, version_ue4=522, compatible=(4,27,2), custom_versions:dict=None, editor=True):
+        self.version_ue4, self.compatible, self.editor = (version_ue4, compatible, editor)
+        self.custom_versions = custom_versions if custom_versions != None else {}
+        self.names:list[str] = []
+        self.name_indices:dict[str,int] = {}
+        self.imports = []
+        self.exports:list[SynthExport] = []
+        self.bulk = Writer(self)
+        self.Name("None")
+    def Name(self, s:str) -> int:
+        if (i := self.name_indices.get(s)) == None:
+            self.name_indices[s] = i = len(self.names)
+            self.names.append(s)
+        return i
+    def AddImport(self, class_package, class_name, object_name, outer_index=0) -> int:
+        self.imports.append((class_package, class_name, outer_index, object_name))
+        return -len(self.imports)
+    def AddPackageImport(self, package_path) -> int: return self.AddImport("/Script/CoreUObject", "Package", package_path)
+    def AddClassImport(self, class_name, script="/Script/Engine") -> int:
+        script_i = next((-i - 1 for i, imp in enumerate(self.imports) if imp[3] == script), None)
+        if script_i == None: script_i = self.AddPackageImport(script)
+        return self.AddImport("/Script/CoreUObject", "Class", class_name, script_i)
+    def AddExport(self, class_index, object_name, outer_index=0) -> SynthExport:
+        self.exports.append(exp := SynthExport(self, class_index, object_name, outer_index))
+        exp.index = len(self.exports)
+        return exp
+    def AddBulk(self, payload:bytes) -> int:
+        offset = len(self.bulk)
+        self.bulk.Bytes(payload)
+        return offset
+
+    def WriteSummary(self, w:Writer, t):
+        v = self.version_ue4
+        w.UInt32(0x9E2A83C1)
+        w.Int32(-7)
+        w.Int32(864)
+        w.Int32(v)
+        w.Int32(0)
+        w.Int32(len(self.custom_versions))
+        for guid, version in self.custom_versions.items():
+            w.Guid(guid)
+            w.Int32(version)
+        w.Int32(t['header_size'])
+        w.FString("None")
+        w.UInt32(0 if self.editor else 0x8)
+        w.Pack('ii', len(self.names), t['names'])
+        if v >= 516: w.FString("")
+        if v >= 459: w.Pack('ii', 0, 0)
+        w.Pack('ii', len(self.exports), t['exports'])
+        w.Pack('ii', len(self.imports), t['imports'])
+        w.Int32(t['depends'])
+        if v >= 384: w.Pack('ii', 0, 0)
+        if v >= 510: w.Int32(0)
+        w.Int32(0)
+        w.Guid(uuid.UUID(int=1))
+        if self.editor and v >= 518:
+            w.Guid(uuid.UUID(int=2))
+            if v < 520: w.Guid(uuid.UUID(int=3))
+        w.Int32(1)
+        w.Pack('ii', len(self.exports), len(self.names))
+        major, minor, patch = self.compatible
+        if v >= 336:
+            w.Pack('HHHI', major, minor, patch, 0)
+            w.FString("++UE4+Release")
+        else: w.UInt32(0)
+        if v >= 444:
+            w.Pack('HHHI', major, minor, patch, 0)
+            w.FString("++UE4+Release")
+        w.UInt32(0)
+        w.Int32(0)
+        w.UInt32(0)
+        w.Int32(0)
+        w.Int32(0)
+        w.Int64(t['bulk'])
+        if v >= 224: w.Int32(0)
+        if v >= 326: w.Int32(0)
+        elif v >= 278: w.Int32(0)
+        if v >= 507: w.Pack('ii', 0, 0)
+    def Build(self) -> bytes:
+        v = self.version_ue4
+        imports = Writer(self)
+        for class_package, class_name, outer_index, object_name in self.imports:
+            imports.FName(class_package)
+            imports.FName(class_name)
+            imports.Int32(outer_index)
+            imports.FName(object_name)
+            if self.editor and v >= 520: imports.FName("None")
+        export_size = len(self.ExportTable({})) # Registers export names before the name table is written
+        names = Writer(self)
+        for name in self.names:
+            names.FString(name)
+            if v >= 504 and name != "": names.UInt32(0)
+
+        t = dict(header_size=0, names=0, exports=0, imports=0, depends=0, bulk=0)
+        self.WriteSummary(summary := Writer(self), t)
+        t['names'] = len(summary)
+        t['imports'] = t['names'] + len(names)
+        t['exports'] = t['imports'] + len(imports)
+        t['depends'] = t['header_size'] = t['exports'] + export_size
+        offsets, p = ({}, t['header_size'])
+        for exp in self.exports:
+            offsets[exp.index] = p
+            p += len(exp.w)
+        t['bulk'] = p
+
+        out = Writer(self)
+        self.WriteSummary(out, t)
+        out.Bytes(names.buf)
+        out.Bytes(imports.buf)
+        out.Bytes(self.ExportTable(offsets).buf)
+        for exp in self.exports: out.Bytes(exp.w.buf)
+        out.Bytes(self.bulk.buf)
+        return bytes(out.buf)
+    def ExportTable(self, offsets:dict) -> Writer:
+        v = self.version_ue4
+        w = Writer(self)
+        for exp in self.exports:
+            w.Pack('ii', exp.class_index, 0)
+            if v >= 508: w.Int32(0)
+            w.Int32(exp.outer_index)
+            w.FName(exp.object_name)
+            w.UInt32(0)
+            if v < 511: w.Pack('ii', len(exp.w), offsets.get(exp.index, 0))
+            else: w.Pack('qq', len(exp.w), offsets.get(exp.index, 0))
+            w.Pack('iii', 0, 0, 0)
+            w.Guid(uuid.UUID(int=0))
+            w.UInt32(0)
+            if v >= 365: w.Int32(0)
+            if v >= 465: w.Int32(1 if exp.outer_index == 0 else 0)
+            if v >= 507: w.Pack('iiiii', -1, 0, 0, 0, 0)
+        return w
+    def Save(self, filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as file: file.write(self.Build())
+        return filepath
+
+def RawMeshPayload(tri_count:int, uv_count=1, colors=True, rng:random.Random=None) -> bytes: # FRawMesh
+    rng = rng if rng else random.Random(1434)
+    vert_c = max(3, tri_count // 2 + 2)
+    w = Writer(None)
+    w.Pack('ii', 1, 0)
+    w.Int32(tri_count)
+    for i in range(tri_count): w.Int32(i % 2)
+    w.Int32(tri_count)
+    for i in range(tri_count): w.UInt32(0)
+    w.Int32(vert_c)
+    for i in range(vert_c): w.Pack('fff', rng.uniform(-100, 100), rng.uniform(-100, 100), rng.uniform(-100, 100))
+    wedge_c = 3 * tri_count
+    w.Int32(wedge_c)
+    for i in range(tri_count): w.Pack('iii', i % vert_c, (i + 1) % vert_c, (i + 2) % vert_c)
+    w.Int32(0) # Tangents
+    w.Int32(0) # Binormals
+    w.Int32(wedge_c)
+    for i in range(wedge_c): w.Pack('fff', 0, 0, 1)
+    for i_uv in range(8):
+        if i_uv < uv_count:
+            w.Int32(wedge_c)
+            for i in range(wedge_c): w.Pack('ff', rng.random(), rng.random())
+        else: w.Int32(0)
+    if colors:
+        w.Int32(wedge_c)
+        for i in range(wedge_c): w.Pack('BBBB', 255, 128, 64, 255)
+    else: w.Int32(0)
+    w.Int32(2)
+    w.Pack('ii', 0, 1)
+    return bytes(w.buf)
+def WriteBulkHeader(w:Writer, pkg:SynthPackage, payload:bytes, count=None):
+    w.UInt32(0x1) # PayloadAtEndOfFile
+    w.UInt32(len(payload) if count == None else count)
+    w.UInt32(len(payload))
+    offset = pkg.AddBulk(payload)
+    if pkg.version_ue4 < 198: w.Int32(offset)
+    else: w.Int64(offset)
+def AddStaticMesh(pkg:SynthPackage, name="SM_Synth", tri_counts=(1000,), uv_count=1, colors=True, materials=()) -> SynthExport:
+    v_obj = pkg.custom_versions.get(v_obj_guid, 0)
+    sm_class = pkg.AddClassImport("StaticMesh")
+    mat_imports = []
+    for mat_path in materials:
+        mat_pkg = pkg.AddPackageImport(mat_path)
+        mat_imports.append(pkg.AddImport("/Script/Engine", "Material", mat_path.rsplit('/', 1)[-1], mat_pkg))
+    exp = pkg.AddExport(sm_class, name)
+    w = exp.w
+    source_models = [{ "BuildSettings": TableProp("MeshBuildSettings", { "bRecomputeNormals": BoolProp(False) }), "ScreenSize": FloatProp(1.0 / (i + 1)) } for i in range(len(tri_counts))]
+    WriteProperties(w, { "SourceModels": StructArrayProp("SourceModels", "StaticMeshSourceModel", source_models), "LightMapResolution": IntProp(64) })
+    w.Int32(0) # No Guid
+    w.Pack('BB', 0, 0) # FStripDataFlags
+    w.Bool32(False) # Cooked
+    w.Int32(0) # BodySetup
+    if pkg.version_ue4 >= 216: w.Int32(0) # NavCollision
+    w.FString("")
+    w.UInt32(0)
+    w.Guid(uuid.UUID(int=4)) # Lighting Guid
+    w.Int32(0) # Sockets
+    for tri_count in tri_counts:
+        payload = RawMeshPayload(tri_count, uv_count, colors)
+        if v_obj < 28:
+            WriteBulkHeader(w, pkg, payload)
+            w.Guid(uuid.UUID(int=5))
+            w.Bool32(False)
+        else:
+            w.Bool32(True)
+            WriteBulkHeader(w, pkg, payload)
+            if v_obj >= 29: w.Guid(uuid.UUID(int=5))
+            if pkg.custom_versions.get(v_ent_obj_guid, 0) >= 8: w.Bool32(False)
+    major, minor, patch = pkg.compatible
+    if major >= 4 and minor >= 14:
+        w.Bool32(False) # SpeedTree
+        if v_obj >= 8:
+            w.Int32(len(mat_imports))
+            for i, mat_import in enumerate(mat_imports):
+                w.Int32(mat_import)
+                w.FName(f"Slot{i}")
+                if pkg.editor: w.FName(f"Slot{i}")
+                if v_obj >= 10:
+                    w.Pack('ii', 1, 0)
+                    w.Pack('ffff', 1, 1, 1, 1)
+    return exp
+def PackNormal(x, y, z): return (int((x + 1) * 127.5) & 0xFF) | ((int((y + 1) * 127.5) & 0xFF) << 8) | ((int((z + 1) * 127.5) & 0xFF) << 16)
+def AddSkeletalMesh(pkg:SynthPackage, name="SK_Synth", vert_count=1000, uv_count=1, bone_count=4, lod_count=1, rng:random.Random=None) -> SynthExport: # 4.16 era FStaticLODModel4 layout
+    rng = rng if rng else random.Random(1434)
+    v = pkg.version_ue4
+    sk_class = pkg.AddClassImport("SkeletalMesh")
+    exp = pkg.AddExport(sk_class, name)
+    w = exp.w
+    WriteProperties(w, {})
+    w.Int32(0)
+    w.Pack('BB', 0, 0)
+    w.Pack('fffffff', 0, 0, 0, 100, 100, 100, 173)
+    w.Int32(1) # Materials
+    w.Int32(0)
+    if v >= 302: w.Bool32(True)
+    w.Int32(bone_count) # FReferenceSkeleton
+    for i in range(bone_count):
+        w.FName(f"Bone{i}")
+        w.Int32(i - 1)
+        if v < 310: w.Pack('BBBB', 0, 0, 0, 255)
+        if v >= 370: w.FString(f"Bone{i}")
+    w.Int32(bone_count)
+    for i in range(bone_count): w.Pack('ffff fff fff', 0, 0, 0, 1, 0, 0, 10 * i, 1, 1, 1)
+    if v >= 310:
+        w.Int32(bone_count)
+        for i in range(bone_count):
+            w.FName(f"Bone{i}")
+            w.Int32(i)
+    w.Int32(lod_count) # LODs
+    for i_lod in range(lod_count):
+        if i_lod: vert_count = max(3, vert_count // 2) # Halved per LOD
+        tri_count = vert_count - 2
+        w.Pack('BB', 1, 1) # LOD strip flags, editor bulk & adjacency stripped
+        w.Int32(1) # Sections
+        w.Pack('BB', 0, 0)
+        w.Int16(0) # Material
+        w.Int16(0) # Chunk
+        w.Pack('ii', 0, tri_count)
+        w.UInt8(0)
+        if v >= 254:
+            w.Bool32(False)
+            w.Int16(-1)
+        if v >= 280: w.UInt8(0)
+        if v < 283: w.Bool32(True)
+        w.UInt8(4) # Index size
+        w.Int32(4)
+        w.Int32(3 * tri_count)
+        for i in range(tri_count): w.Pack('III', i, i + 1, i + 2)
+        w.Int32(bone_count)
+        for i in range(bone_count): w.Int16(i)
+        w.Int32(1) # Chunks
+        w.Pack('BB', 1, 0) # Editor stripped
+        w.Int32(0)
+        w.Int32(bone_count)
+        for i in range(bone_count): w.UInt16(i)
+        w.Pack('iii', 0, vert_count, 4)
+        if v >= 254:
+            w.Pack('iii', 0, 0, 0)
+            w.Pack('hh', -1, -1)
+        w.Int32(0) # Size
+        w.Int32(vert_count)
+        w.Int32(bone_count)
+        for i in range(bone_count): w.Int16(i)
+        if v >= 152:
+            w.Int32(0)
+            w.Int32(vert_count - 1)
+        w.Int32(uv_count)
+        if v >= 269: w.Pack('BB', 0, 1) # No adjacency
+        w.Int32(uv_count)
+        w.Bool32(False) # Half UVs
+        if v >= 334: w.Bool32(False)
+        w.Pack('fff', 100, 100, 100)
+        w.Pack('fff', 0, 0, 0)
+        w.Int32(8 + 8 + 12 + 4 * uv_count)
+        w.Int32(vert_count)
+        for i in range(vert_count):
+            w.Pack('II', PackNormal(1, 0, 0), PackNormal(0, 0, 1))
+            bone = i % bone_count
+            w.Pack('BBBB', bone, (bone + 1) % bone_count, 0, 0)
+            w.Pack('BBBB', 191, 64, 0, 0)
+            w.Pack('fff', rng.uniform(-100, 100), rng.uniform(-100, 100), rng.uniform(-100, 100))
+            for i_uv in range(uv_count): w.Pack('ee', rng.random(), rng.random())
+    return exp
+prop_kinds = ("int", "float", "bool", "color", "ints", "str", "name", "enum", "vector", "table")
+def MakeProp(kind:str, rng:random.Random) -> Prop:
+    match kind:
+        case "int": return IntProp(rng.randint(-1000, 1000))
+        case "float": return FloatProp(rng.random())
+        case "bool": return BoolProp(rng.random() > 0.5)
+        case "color": return ColorProp(255, 128, 0)
+        case "ints": return IntArrayProp([rng.randint(0, 100) for i in range(8)])
+        case "str": return StrProp(f"Synth {rng.randint(0, 1 << 20)}")
+        case "name": return NameProp(f"SynthName_{rng.randint(0, 63)}")
+        case "enum": return EnumProp("ESynthEnum", f"ESynthEnum::Value{rng.randint(0, 7)}")
+        case "vector": return VectorProp(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1))
+        case "table": return TableProp("ResponseChannel", { "Channel": NameProp("WorldStatic"), "Response": ByteEnumProp("ECollisionResponse", "ECR_Block") })
+        case _: raise Exception(f"Unknown property kind \"{kind}\"")
+def AddPropertyExports(pkg:SynthPackage, count=100, props_per_export=20, class_name="StaticMeshActor", prop_mix=prop_kinds[:5], rng:random.Random=None) -> list[SynthExport]:
+    rng = rng if rng else random.Random(1434)
+    actor_class = pkg.AddClassImport(class_name)
+    comp_class = pkg.AddClassImport("StaticMeshComponent")
+    mesh_pkg = pkg.AddPackageImport("/Game/Synth/SM_Synth")
+    mesh_imp = pkg.AddImport("/Script/Engine", "StaticMesh", "SM_Synth", mesh_pkg)
+    exports = []
+    for i in range(count):
+        actor = pkg.AddExport(actor_class, f"{class_name}_{i}")
+        comp = pkg.AddExport(comp_class, "StaticMeshComponent0", actor.index)
+        WriteProperties(comp.w, {
+            "StaticMesh": ObjectProp(mesh_imp),
+            "RelativeLocation": VectorProp(rng.uniform(-1e4, 1e4), rng.uniform(-1e4, 1e4), rng.uniform(0, 1e3)),
+            "RelativeRotation": RotatorProp(0, rng.uniform(-180, 180), 0),
+            "RelativeScale3D": VectorProp(1, 1, 1),
+            "Mobility": ByteEnumProp("EComponentMobility", "EComponentMobility::Static"),
+        })
+        comp.w.Int32(0)
+        props = { "StaticMeshComponent": ObjectProp(comp.index), "RootComponent": ObjectProp(comp.index), "ActorLabel": StrProp(f"Synth Actor {i}"), "FolderPath": NameProp("Synth/Props") }
+        for i_prop in range(max(0, props_per_export - len(props))):
+            kind = prop_mix[i_prop % len(prop_mix)]
+            props[f"{kind.capitalize()}Value{i_prop}"] = MakeProp(kind, rng)
+        WriteProperties(actor.w, props)
+        actor.w.Int32(0)
+        exports += (actor, comp)
+    return exports
+
+def RotatorMatrix(pitch, yaw, roll, scale=1, translation=(0, 0, 0)) -> list[float]: # FScaleRotationTranslationMatrix, row major
+    sp, cp, sy, cy, sr, cr = (f(math.radians(a)) for a in (pitch, yaw, roll) for f in (math.sin, math.cos))
+    rows = ((cp * cy, cp * sy, sp), (sr * sp * cy - cr * sy, sr * sp * sy + cr * cy, -sr * cp), (-(cr * sp * cy + sr * sy), cy * sr - cr * sp * sy, cr * cp))
+    return [v * scale for row in rows for v in (*row, 0)] + [*translation, 1]
+def AddFoliageExports(pkg:SynthPackage, instance_count=1000, rng:random.Random=None) -> list[SynthExport]: # InstancedFoliageActor with one foliage component, 4.27 ISM layout
+    rng = rng if rng else random.Random(1434)
+    actor_class = pkg.AddClassImport("InstancedFoliageActor", "/Script/Foliage")
+    root_class = pkg.AddClassImport("SceneComponent")
+    comp_class = pkg.AddClassImport("FoliageInstancedStaticMeshComponent", "/Script/Foliage")
+    mesh_pkg = pkg.AddPackageImport("/Game/Synth/SM_Synth")
+    mesh_imp = pkg.AddImport("/Script/Engine", "StaticMesh", "SM_Synth", mesh_pkg)
+    actor = pkg.AddExport(actor_class, "InstancedFoliageActor_0")
+    root = pkg.AddExport(root_class, "DefaultSceneRoot", actor.index)
+    WriteProperties(root.w, {})
+    root.w.Int32(0)
+    comp = pkg.AddExport(comp_class, "FoliageInstancedStaticMeshComponent_0", actor.index)
+    WriteProperties(comp.w, { "StaticMesh": ObjectProp(mesh_imp), "AttachParent": ObjectProp(root.index), "Mobility": ByteEnumProp("EComponentMobility", "EComponentMobility::Static") })
+    comp.w.Int32(0)
+    comp.w.Int32(1) # LODData, FStaticMeshComponentLODInfo
+    comp.w.Pack('BB', 0, 0)
+    comp.w.Guid(uuid.UUID(int=rng.getrandbits(128))) # MapBuildDataId
+    comp.w.UInt8(0) # No override vertex colors
+    comp.w.Int32(0) # PaintedVertices
+    comp.w.Bool32(False) # bCooked
+    comp.w.Pack('ii', 64, instance_count) # PerInstanceSMData
+    for i in range(instance_count): comp.w.Pack('16f', *RotatorMatrix(rng.uniform(-10, 10), rng.uniform(-180, 180), rng.uniform(-10, 10), rng.uniform(0.5, 2), (rng.uniform(-1e4, 1e4), rng.uniform(-1e4, 1e4), rng.uniform(0, 1e2))))
+    comp.w.Pack('ii', 4, 0) # PerInstanceSMCustomData
+    WriteProperties(actor.w, { "RootComponent": ObjectProp(root.index), "ActorLabel": StrProp("Foliage") })
+    actor.w.Int32(0)
+    return [actor, root, comp]
+
+def SynthStaticMeshPackage(tri_count=1000, lod_count=1, version_ue4=522, uv_count=1) -> SynthPackage:
+    pkg = SynthPackage(version_ue4, (4,27,2), { v_obj_guid:40, v_ent_obj_guid:10 })
+    AddStaticMesh(pkg, tri_counts=tuple(max(1, tri_count >> i) for i in range(lod_count)), uv_count=uv_count, materials=("/Game/Synth/M_Synth",))
+    return pkg
+def SynthSkeletalMeshPackage(vert_count=1000, version_ue4=513, uv_count=1, lod_count=1) -> SynthPackage:
+    pkg = SynthPackage(version_ue4, (4,16,0), { v_obj_guid:0, v_ren_guid:0, v_skel_guid:0 })
+    AddSkeletalMesh(pkg, vert_count=vert_count, uv_count=uv_count, lod_count=lod_count)
+    return pkg
+def SynthMapPackage(actor_count=100, props_per_export=20, version_ue4=522, prop_mix=prop_kinds[:5], extra_names=0, extra_imports=0, foliage_instances=0) -> SynthPackage:
+    pkg = SynthPackage(version_ue4, custom_versions={ v_obj_guid:40, v_ren_guid:44 }) # 4.27, ISM components read their LODData & bCooked by these
+    AddPropertyExports(pkg, actor_count, props_per_export, prop_mix=prop_mix)
+    if foliage_instances: AddFoliageExports(pkg, foliage_instances)
+    for i in range(extra_names): pkg.Name(f"SynthPadding{i}")
+    for i in range(extra_imports): pkg.AddPackageImport(f"/Game/Synth/Padding/P_{i}")
+    return pkg
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic UE4 packages")
+    parser.add_argument('out_dir')
+    parser.add_argument('--version', type=int, default=522)
+    parser.add_argument('--actors', type=int, default=1000)
+    parser.add_argument('--props', type=int, default=20)
+    parser.add_argument('--mix', default=",".join(prop_kinds[:5]), help=f"Comma separated property kinds: {', '.join(prop_kinds)}")
+    parser.add_argument('--names', type=int, default=0, help="Extra padding names")
+    parser.add_argument('--imports', type=int, default=0, help="Extra padding package imports")
+    parser.add_argument('--foliage', type=int, default=0, help="Foliage instances")
+    parser.add_argument('--tris', type=int, default=10000)
+    parser.add_argument('--lods', type=int, default=1)
+    parser.add_argument('--verts', type=int, default=10000)
+    args = parser.parse_args()
+    content = os.path.join(args.out_dir, "Content", "Synth")
+    print(SynthMapPackage(args.actors, args.props, args.version, tuple(args.mix.split(',')), args.names, args.imports, args.foliage).Save(os.path.join(content, "Synth.umap")))
+    print(SynthStaticMeshPackage(args.tris, args.lods, args.version).Save(os.path.join(content, "SM_Synth.uasset")))
+    print(SynthSkeletalMeshPackage(args.verts, lod_count=args.lods).Save(os.path.join(content, "SK_Synth.uasset")))